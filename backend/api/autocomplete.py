@@ -0,0 +1,113 @@
+"""
+Автодополнение названий продуктов.
+"""
+import bisect
+import threading
+import time
+
+from django.conf import settings
+from django.db.models import Case, IntegerField, Value, When
+from recipes.models import Ingredient
+
+from .cache import get_version
+
+INGREDIENT_FIELDS = ('id', 'name', 'measurement_unit')
+
+
+class IngredientIndex:
+    """
+    Индекс названий продуктов в памяти процесса.
+    Названия хранятся в отсортированном списке: совпадения по префиксу
+    находятся двоичным поиском, по подстроке — просмотром списка.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.entries = ((), ())
+        self.version = None
+        self.built_at = None
+
+    def is_stale(self, version):
+        """
+        Метод проверки актуальности индекса: индекс устаревает при
+        смене версии справочника продуктов или по истечении TTL.
+        """
+        return (
+            self.built_at is None
+            or self.version != version
+            or time.monotonic() - self.built_at
+            > settings.INGREDIENT_AUTOCOMPLETE_INDEX_TTL
+        )
+
+    def build(self, version):
+        """
+        Метод построения индекса одним запросом к базе.
+        """
+        built_at = time.monotonic()
+        items = sorted(
+            Ingredient.objects.values(*INGREDIENT_FIELDS),
+            key=lambda item: (item['name'].lower(), item['id']),
+        )
+        self.entries = (
+            tuple(item['name'].lower() for item in items), tuple(items))
+        self.version = version
+        self.built_at = built_at
+
+    def refresh(self):
+        """
+        Метод перестроения устаревшего индекса.
+        """
+        version = get_version('ingredients')
+        if self.is_stale(version):
+            with self.lock:
+                if self.is_stale(version):
+                    self.build(version)
+
+    def search(self, query, limit):
+        """
+        Метод поиска продуктов: сначала совпадения по началу
+        названия, затем по подстроке, не более limit результатов.
+        """
+        self.refresh()
+        keys, items = self.entries
+        query = query.lower()
+        result = []
+        position = bisect.bisect_left(keys, query)
+        while (position < len(keys) and len(result) < limit
+               and keys[position].startswith(query)):
+            result.append(items[position])
+            position += 1
+        for key, item in zip(keys, items):
+            if len(result) >= limit:
+                break
+            if query in key and not key.startswith(query):
+                result.append(item)
+        return result
+
+
+ingredient_index = IngredientIndex()
+
+
+def search_ingredients_in_db(query, limit):
+    """
+    Поиск продуктов запросом к базе с тем же порядком результатов.
+    """
+    return list(
+        Ingredient.objects.filter(name__icontains=query).annotate(
+            match_rank=Case(
+                When(name__istartswith=query, then=Value(0)),
+                default=Value(1),
+                output_field=IntegerField(),
+            )
+        ).order_by('match_rank', 'name').values(*INGREDIENT_FIELDS)[:limit]
+    )
+
+
+def search_ingredients(query):
+    """
+    Метод поиска продуктов для автодополнения.
+    """
+    limit = settings.INGREDIENT_AUTOCOMPLETE_LIMIT
+    if settings.INGREDIENT_AUTOCOMPLETE_INDEX:
+        return ingredient_index.search(query, limit)
+    return search_ingredients_in_db(query, limit)
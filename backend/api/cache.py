@@ -0,0 +1,108 @@
+"""
+Кэширование справочных данных: тегов и продуктов.
+Ключи данных содержат версию справочника, версия хранится
+в базе данных и меняется при любом изменении его записей.
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+from recipes.models import ReferenceVersion, Tag
+from rest_framework.response import Response
+
+# Версии справочников в памяти процесса:
+# справочник: (момент чтения, (версия, время изменения)).
+_versions = {}
+
+
+def get_reference(name):
+    """
+    Метод получения версии справочника и времени его изменения.
+    Значение хранится в памяти процесса не дольше
+    REFERENCE_VERSION_TTL секунд, затем перечитывается из базы.
+    """
+    now = time.monotonic()
+    cached = _versions.get(name)
+    if (cached is not None
+            and now - cached[0] < settings.REFERENCE_VERSION_TTL):
+        return cached[1]
+    reference = ReferenceVersion.objects.filter(name=name).values_list(
+        'version', 'updated').first()
+    if reference is None:
+        created = ReferenceVersion.objects.get_or_create(name=name)[0]
+        reference = (created.version, created.updated)
+    if not connection.in_atomic_block:
+        _versions[name] = (now, reference)
+    return reference
+
+
+def get_version(name):
+    """
+    Метод получения версии справочника.
+    """
+    return get_reference(name)[0]
+
+
+def forget_version(name):
+    """
+    Метод удаления версии справочника из памяти процесса.
+    """
+    _versions.pop(name, None)
+
+
+def bump_version(name):
+    """
+    Метод смены версии справочника после изменения данных.
+    """
+    _, created = ReferenceVersion.objects.get_or_create(name=name)
+    if not created:
+        ReferenceVersion.objects.filter(name=name).update(
+            version=F('version') + 1, updated=timezone.now())
+    forget_version(name)
+    transaction.on_commit(lambda: forget_version(name))
+
+
+def get_tag_ids():
+    """
+    Метод получения словаря id тегов по slug из кэша.
+    """
+    key = f'tag_ids:{get_version("tags")}'
+    tag_ids = cache.get(key)
+    if tag_ids is None:
+        tag_ids = dict(Tag.objects.values_list('slug', 'id'))
+        cache.set(key, tag_ids, settings.REFERENCE_CACHE_TIMEOUT)
+    return tag_ids
+
+
+class CachedListMixin:
+    """
+    Кэширование списка объектов справочника
+    с поддержкой заголовков ETag и Last-Modified.
+    """
+    cache_name = None
+
+    def list(self, request, *args, **kwargs):
+        """
+        Метод получения списка объектов справочника из кэша.
+        """
+        version, updated = get_reference(self.cache_name)
+        last_modified = int(updated.timestamp())
+        etag = quote_etag(f'{self.cache_name}-{version}')
+        response = get_conditional_response(
+            request, etag=etag, last_modified=last_modified)
+        if response is None:
+            key = f'reference:{self.cache_name}:{version}'
+            data = cache.get(key)
+            if data is None:
+                data = super().list(request, *args, **kwargs).data
+                cache.set(key, data, settings.REFERENCE_CACHE_TIMEOUT)
+            response = Response(data)
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified)
+        patch_cache_control(response, no_cache=True)
+        return response
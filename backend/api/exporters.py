@@ -0,0 +1,152 @@
+"""
+Выгрузка списка покупок в разных форматах.
+Формат выбирается по заголовку Accept или параметру format.
+"""
+import abc
+import csv
+import json
+
+from django.http import StreamingHttpResponse
+from rest_framework import renderers
+
+from .utils import render_shopping_cart
+
+CHUNK_SIZE = 64 * 1024
+
+
+class Echo:
+    """
+    Буфер, возвращающий записанную строку вместо ее хранения.
+    """
+
+    def write(self, value):
+        return value
+
+
+class ShoppingCartExporter(abc.ABC, renderers.BaseRenderer):
+    """
+    Базовый класс выгрузки списка покупок.
+    Строки списка содержат ключи name, measurement_unit и amount.
+    """
+    charset = 'utf-8'
+
+    @abc.abstractmethod
+    def stream(self, rows, user):
+        """
+        Метод построчной выгрузки списка покупок.
+        """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        """
+        Метод выгрузки списка покупок одним блоком.
+        """
+        user = (renderer_context or {}).get('request').user
+        return b''.join(
+            chunk if isinstance(chunk, bytes) else chunk.encode(self.charset)
+            for chunk in self.stream(data, user)
+        )
+
+    def response(self, rows, user):
+        """
+        Метод создания потокового ответа со списком покупок.
+        """
+        return self.streaming_response(self.stream(rows, user))
+
+    def streaming_response(self, streaming_content):
+        """
+        Метод создания потокового ответа с заголовками выгрузки.
+        """
+        content_type = self.media_type
+        if self.charset:
+            content_type = f'{content_type}; charset={self.charset}'
+        response = StreamingHttpResponse(
+            streaming_content, content_type=content_type)
+        response[
+            'Content-Disposition'
+        ] = f'attachment; filename = "shopping_cart.{self.format}"'
+        return response
+
+
+def chunks(content, chunk_size=CHUNK_SIZE):
+    """
+    Метод разбиения содержимого ответа на части.
+    """
+    for start in range(0, len(content), chunk_size):
+        yield content[start:start + chunk_size]
+
+
+class PDFExporter(ShoppingCartExporter):
+    """
+    Выгрузка списка покупок в формате PDF.
+    Готовый документ берется из кэша по хэшу содержимого.
+    """
+    media_type = 'application/pdf'
+    format = 'pdf'
+    charset = None
+
+    def stream(self, rows, user):
+        return chunks(render_shopping_cart(rows, user))
+
+    def response(self, rows, user):
+        content = render_shopping_cart(rows, user)
+        response = self.streaming_response(chunks(content))
+        response['Content-Length'] = len(content)
+        return response
+
+
+class CSVExporter(ShoppingCartExporter):
+    """
+    Выгрузка списка покупок в формате CSV.
+    """
+    media_type = 'text/csv'
+    format = 'csv'
+
+    def stream(self, rows, user):
+        writer = csv.writer(Echo())
+        yield writer.writerow(('name', 'measurement_unit', 'amount'))
+        for item in rows:
+            yield writer.writerow((
+                item['name'], item['measurement_unit'], item['amount']))
+
+
+class TextExporter(ShoppingCartExporter):
+    """
+    Выгрузка списка покупок в виде текста.
+    """
+    media_type = 'text/plain'
+    format = 'txt'
+
+    def stream(self, rows, user):
+        yield 'Список покупок:\n'
+        for number, item in enumerate(rows, start=1):
+            yield (
+                f'{number}.  {item["name"]} - '
+                f'{item["amount"]} {item["measurement_unit"]}\n'
+            )
+
+
+class JSONExporter(ShoppingCartExporter):
+    """
+    Выгрузка списка покупок в формате JSON.
+    """
+    media_type = 'application/json'
+    format = 'json'
+
+    def stream(self, rows, user):
+        separator = '['
+        for item in rows:
+            yield separator + json.dumps({
+                'name': item['name'],
+                'measurement_unit': item['measurement_unit'],
+                'amount': item['amount'],
+            }, ensure_ascii=False)
+            separator = ','
+        yield '[]' if separator == '[' else ']'
+
+
+SHOPPING_CART_EXPORTERS = (
+    PDFExporter,
+    CSVExporter,
+    TextExporter,
+    JSONExporter,
+)
@@ -0,0 +1,105 @@
+"""
+Поля сериализаторов.
+"""
+import base64
+import binascii
+import string
+
+from django.conf import settings
+from django.core.files.uploadedfile import TemporaryUploadedFile
+from django.template.defaultfilters import filesizeformat
+from drf_extra_fields.fields import Base64FieldMixin, Base64ImageField
+from PIL import Image
+from rest_framework import serializers
+
+BASE64_HEADER = ';base64,'
+WHITESPACE_TABLE = str.maketrans('', '', string.whitespace)
+
+
+def decoded_size(data):
+    """
+    Метод вычисления размера данных base64 после декодирования.
+    Пробельные символы, например переносы строк, не учитываются.
+    """
+    length = len(data) - sum(data.count(char) for char in string.whitespace)
+    padding = data[-8:].translate(WHITESPACE_TABLE)[-2:].count('=')
+    return length // 4 * 3 - padding
+
+
+class StreamingBase64ImageField(Base64ImageField):
+    """
+    Поле изображения в base64 с ограничением размера.
+    Размер проверяется по длине строки до декодирования,
+    строка декодируется частями во временный файл на диске,
+    а размеры изображения читаются из заголовка файла
+    до декодирования пикселей.
+    """
+    FORMAT_EXTENSIONS = {'jpeg': 'jpg'}
+
+    def to_internal_value(self, base64_data):
+        if base64_data in self.EMPTY_VALUES:
+            return None
+        if not isinstance(base64_data, str):
+            raise serializers.ValidationError(self.INVALID_FILE_MESSAGE)
+        base64_data = base64_data.rpartition(BASE64_HEADER)[2]
+        size = decoded_size(base64_data)
+        if size > settings.RECIPE_IMAGE_UPLOAD_MAX_BYTES:
+            raise serializers.ValidationError(
+                'Размер изображения не должен превышать '
+                f'{filesizeformat(settings.RECIPE_IMAGE_UPLOAD_MAX_BYTES)}!')
+        upload = TemporaryUploadedFile(
+            self.get_file_name(None), 'application/octet-stream', size, None)
+        try:
+            self.decode(base64_data, upload)
+            upload.name = '.'.join(
+                (upload.name, self.check_image(upload)))
+            return super(Base64FieldMixin, self).to_internal_value(upload)
+        except Exception:
+            upload.close()
+            raise
+
+    def decode(self, base64_data, output):
+        """
+        Метод декодирования строки base64 частями в файл output.
+        Из частей удаляются пробельные символы, а символы сверх
+        кратного четырем числа переносятся в следующую часть.
+        """
+        chunk_size = settings.RECIPE_IMAGE_DECODE_CHUNK_SIZE
+        rest = ''
+        try:
+            for start in range(0, len(base64_data), chunk_size):
+                chunk = rest + base64_data[
+                    start:start + chunk_size].translate(WHITESPACE_TABLE)
+                end = len(chunk) - len(chunk) % 4
+                output.write(base64.b64decode(chunk[:end], validate=True))
+                rest = chunk[end:]
+        except (binascii.Error, ValueError):
+            raise serializers.ValidationError(self.INVALID_FILE_MESSAGE)
+        if rest:
+            raise serializers.ValidationError(self.INVALID_FILE_MESSAGE)
+        output.flush()
+        output.size = output.tell()
+        output.seek(0)
+
+    def check_image(self, upload):
+        """
+        Метод проверки формата и числа пикселей изображения
+        по заголовку файла. Возвращает расширение файла.
+        """
+        max_pixels = settings.RECIPE_IMAGE_UPLOAD_MAX_PIXELS
+        too_large = serializers.ValidationError(
+            f'Изображение не должно содержать больше {max_pixels} пикселей!')
+        try:
+            with Image.open(upload.temporary_file_path()) as image:
+                image_format = (image.format or '').lower()
+                width, height = image.size
+        except Image.DecompressionBombError:
+            raise too_large
+        except OSError:
+            raise serializers.ValidationError(self.INVALID_FILE_MESSAGE)
+        extension = self.FORMAT_EXTENSIONS.get(image_format, image_format)
+        if extension not in self.ALLOWED_TYPES:
+            raise serializers.ValidationError(self.INVALID_TYPE_MESSAGE)
+        if width * height > max_pixels:
+            raise too_large
+        return extension
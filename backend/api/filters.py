@@ -2,35 +2,80 @@
 Настройка пользовательских фильтров.
 """
 
+from django.db.models import Count, Exists, OuterRef
 from django_filters import rest_framework as django_filter
-from recipes.models import Recipe
-from rest_framework import filters
+from recipes.models import Recipe, TagRecipe
 from users.models import User
 
+from .cache import get_tag_ids
+from .search import search_recipes
+
+TAGS_MODES = (
+    ('any', 'Любой из тегов'),
+    ('all', 'Все теги'),
+)
+
+
+def tag_choices():
+    return [(slug, slug) for slug in get_tag_ids()]
+
 
 class RecipeFilters(django_filter.FilterSet):
     """
     Настройка фильтров модели рецептов.
     """
     author = django_filter.ModelChoiceFilter(queryset=User.objects.all())
-    tags = django_filter.AllValuesMultipleFilter(field_name='tags__slug')
+    tags = django_filter.MultipleChoiceFilter(
+        choices=tag_choices, method='get_tags')
+    tags_mode = django_filter.ChoiceFilter(
+        choices=TAGS_MODES, method='get_tags_mode')
     is_favorited = django_filter.BooleanFilter(method='get_is_favorited')
     is_in_shopping_cart = django_filter.BooleanFilter(
         method='get_is_in_shopping_cart')
+    search = django_filter.CharFilter(method='get_search')
 
     class Meta:
         """
         Мета параметры фильтров модели рецептов.
         """
         model = Recipe
-        fields = ('author', 'tags', 'is_favorited', 'is_in_shopping_cart')
+        fields = ('author', 'tags', 'tags_mode', 'is_favorited',
+                  'is_in_shopping_cart', 'search')
+
+    def get_tags(self, queryset, name, value):
+        """
+        Метод обработки фильтров параметра tags.
+        Теги ищутся по id без соединения с таблицей тегов: для режима
+        any — подзапросом EXISTS по индексу (recipe, tag), для режима
+        all — подзапросом с группировкой по индексу (tag, recipe).
+        Теги, которых еще нет в кэше, пропускаются.
+        """
+        tag_ids = get_tag_ids()
+        tag_ids = {tag_ids.get(slug) for slug in value} - {None}
+        mode_all = self.form.cleaned_data.get('tags_mode') == 'all'
+        if not tag_ids or mode_all and len(tag_ids) < len(set(value)):
+            return queryset.none()
+        if mode_all:
+            return queryset.filter(id__in=TagRecipe.objects.filter(
+                tag_id__in=tag_ids,
+            ).values('recipe_id').annotate(
+                tags_count=Count('tag_id'),
+            ).filter(tags_count=len(tag_ids)).values('recipe_id'))
+        return queryset.filter(Exists(TagRecipe.objects.filter(
+            recipe_id=OuterRef('pk'), tag_id__in=tag_ids)))
+
+    def get_tags_mode(self, queryset, name, value):
+        """
+        Режим учитывается при обработке параметра tags.
+        """
+        return queryset
 
     def get_is_favorited(self, queryset, name, value):
         """
         Метод обработки фильтров параметра is_favorited.
         """
         if self.request.user.is_authenticated and value:
-            return queryset.filter(favorites__user=self.request.user)
+            return queryset.filter(is_favorited=True)
         return queryset
 
     def get_is_in_shopping_cart(self, queryset, name, value):
@@ -38,12 +83,14 @@ class RecipeFilters(django_filter.FilterSet):
         Метод обработки фильтров параметра is_in_shopping_cart.
         """
         if self.request.user.is_authenticated and value:
-            return queryset.filter(carts__user=self.request.user)
+            return queryset.filter(is_in_shopping_cart=True)
         return queryset.all()
 
-
-class IngredientSearchFilter(filters.SearchFilter):
-    """
-    Настройка фильтра поиска модели продуктов.
-    """
-    search_param = 'name'
+    def get_search(self, queryset, name, value):
+        """
+        Метод полнотекстового поиска по названию, описанию
+        и продуктам рецепта.
+        """
+        if not value.strip():
+            return queryset
+        return search_recipes(queryset, value)
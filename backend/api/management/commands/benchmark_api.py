@@ -0,0 +1,344 @@
+import json
+import os
+import statistics
+import tempfile
+import time
+from collections import namedtuple
+
+from api.renderers import FastJSONRenderer, orjson
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext, override_settings
+from recipes.management.commands.seed_data import SEED_PASSWORD
+from recipes.models import Cart, Favorite, Ingredient, Recipe, Subscribe, Tag
+from rest_framework.authtoken.models import Token
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+from users.models import User
+
+Case = namedtuple('Case', ('name', 'method', 'path', 'auth', 'data'))
+
+BASELINE_PATH = os.path.join(
+    settings.BASE_DIR, 'benchmarks', 'api_baseline.json')
+
+PARITY_PATHS = (
+    '/api/recipes/?limit=100',
+    '/api/recipes/?limit=100&cursor=',
+    '/api/recipes/popular/?limit=100',
+    '/api/recipes/feed/?limit=100',
+)
+
+PNG_PIXEL = (
+    'data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAA'
+    'DUlEQVR42mNk+M9QDwADhgGAWjR9awAAAABJRU5ErkJggg=='
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'замер времени ответа и числа запросов к базе для эндпоинтов API; '
+        'данные создаются командой seed_data'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=20)
+        parser.add_argument(
+            '--baseline', default=BASELINE_PATH,
+            help='файл с сохраненными результатами для сравнения')
+        parser.add_argument(
+            '--save-baseline', action='store_true',
+            help='сохранить результаты замеров как новую базовую линию')
+        parser.add_argument(
+            '--tolerance', type=float, default=0.25,
+            help='относительный рост p95, после которого выводится '
+                 'предупреждение')
+        parser.add_argument(
+            '--size-tolerance', type=float, default=0.1,
+            help='допустимый относительный рост размера ответа')
+        parser.add_argument(
+            '--only', nargs='+', metavar='NAME',
+            help='замерить только указанные эндпоинты')
+        parser.add_argument(
+            '--renderers', action='store_true',
+            help='сравнить время рендеринга JSON страницы из 100 рецептов')
+
+    def handle(self, *args, **options):
+        cases = self.get_cases()
+        if options['renderers']:
+            self.compare_renderers(options['iterations'])
+            return
+        if options['only']:
+            cases = [case for case in cases if case.name in options['only']]
+        errors = self.check_parity()
+        results = {}
+        with tempfile.TemporaryDirectory() as media_root:
+            with override_settings(MEDIA_ROOT=media_root):
+                for case in cases:
+                    results[case.name] = self.measure(
+                        case, options['iterations'])
+                    self.print_result(case.name, results[case.name])
+
+        errors += [
+            f'{name}: HTTP {result["status"]}'
+            for name, result in results.items() if result['status'] >= 400
+        ]
+        if options['save_baseline']:
+            self.save_baseline(options['baseline'], results)
+        elif os.path.exists(options['baseline']):
+            errors += self.compare(
+                options['baseline'], results, options['tolerance'],
+                options['size_tolerance'])
+        if errors:
+            raise CommandError('\n'.join(['Регрессия замеров:', *errors]))
+
+    def get_cases(self):
+        """
+        Формирование списка запросов ко всем маршрутам api/urls.py.
+        """
+        user = User.objects.filter(
+            email__endswith='@foodgram.local',
+            recipes__isnull=False,
+        ).first()
+        if user is None:
+            raise CommandError(
+                'Нет данных для замеров, выполните manage.py seed_data')
+        self.user = user
+        recipe = user.recipes.first()
+        carted = Cart.objects.filter(user=user).first().recipe_id
+        favorited = Favorite.objects.filter(user=user).first().recipe_id
+        other = Recipe.objects.exclude(carts__user=user).exclude(
+            favorites__user=user).first().id
+        week = list(Recipe.objects.exclude(carts__user=user).exclude(
+            favorites__user=user).values_list('id', flat=True)[:7])
+        followed = Subscribe.objects.filter(user=user).first().following_id
+        not_followed = User.objects.exclude(
+            following__user=user).exclude(id=user.id).first().id
+        ingredient = Ingredient.objects.first()
+        tag = Tag.objects.first()
+        recipe_data = {
+            'name': 'Замер', 'text': 'Замер', 'cooking_time': 10,
+            'image': PNG_PIXEL, 'tags': [tag.id],
+            'ingredients': [
+                {'id': ingredient_id, 'amount': 10}
+                for ingredient_id in Ingredient.objects.values_list(
+                    'id', flat=True)[:10]
+            ],
+        }
+        return [
+            Case('users-list', 'get', '/api/users/', False, None),
+            Case('users-detail', 'get', f'/api/users/{followed}/', True,
+                 None),
+            Case('users-me', 'get', '/api/users/me/', True, None),
+            Case('users-create', 'post', '/api/users/', False, {
+                'email': 'benchmark@foodgram.local',
+                'username': 'benchmark', 'first_name': 'Имя',
+                'last_name': 'Фамилия', 'password': SEED_PASSWORD}),
+            Case('token-login', 'post', '/api/auth/token/login/', False, {
+                'email': user.email, 'password': SEED_PASSWORD}),
+            Case('tags-list', 'get', '/api/tags/', False, None),
+            Case('tags-detail', 'get', f'/api/tags/{tag.id}/', False, None),
+            Case('ingredients-list', 'get', '/api/ingredients/', False, None),
+            Case('ingredients-search', 'get',
+                 f'/api/ingredients/?name={ingredient.name[:2]}', False,
+                 None),
+            Case('ingredients-detail', 'get',
+                 f'/api/ingredients/{ingredient.id}/', False, None),
+            Case('recipes-list-anonymous', 'get', '/api/recipes/', False,
+                 None),
+            Case('recipes-list', 'get', '/api/recipes/?limit=100', True,
+                 None),
+            Case('recipes-list-filtered', 'get',
+                 f'/api/recipes/?tags={tag.slug}&is_favorited=1', True, None),
+            Case('recipes-popular', 'get', '/api/recipes/popular/', True,
+                 None),
+            Case('recipes-feed', 'get', '/api/recipes/feed/', True, None),
+            Case('recipes-search', 'get',
+                 f'/api/recipes/?search={ingredient.name}', True, None),
+            Case('recipes-cook', 'get', '/api/recipes/cook/?' + '&'.join(
+                f'ingredients={ingredient_id}'
+                for ingredient_id in Ingredient.objects.values_list(
+                    'id', flat=True)[:20]), True, None),
+            Case('recipes-detail', 'get', f'/api/recipes/{recipe.id}/', True,
+                 None),
+            Case('recipes-create', 'post', '/api/recipes/', True,
+                 recipe_data),
+            Case('recipes-update', 'patch', f'/api/recipes/{recipe.id}/',
+                 True, recipe_data),
+            Case('recipes-delete', 'delete', f'/api/recipes/{recipe.id}/',
+                 True, None),
+            Case('favorite-create', 'post', f'/api/recipes/{other}/favorite/',
+                 True, None),
+            Case('favorite-delete', 'delete',
+                 f'/api/recipes/{favorited}/favorite/', True, None),
+            Case('cart-create', 'post',
+                 f'/api/recipes/{other}/shopping_cart/', True, None),
+            Case('cart-delete', 'delete',
+                 f'/api/recipes/{carted}/shopping_cart/', True, None),
+            Case('favorite-create-many', 'post', '/api/recipes/favorite/',
+                 True, {'recipes': week}),
+            Case('favorite-clear', 'delete', '/api/recipes/favorite/', True,
+                 {'all': True}),
+            Case('cart-create-many', 'post', '/api/recipes/shopping_cart/',
+                 True, {'recipes': week}),
+            Case('cart-clear', 'delete', '/api/recipes/shopping_cart/', True,
+                 {'all': True}),
+            Case('download-pdf', 'get', '/api/recipes/download_shopping_cart/',
+                 True, None),
+            Case('download-csv', 'get',
+                 '/api/recipes/download_shopping_cart/?format=csv', True,
+                 None),
+            Case('shopping-list', 'get', '/api/recipes/shopping_list/', True,
+                 None),
+            Case('subscriptions', 'get',
+                 '/api/users/subscriptions/?recipes_limit=3', True, None),
+            Case('subscribe', 'post', f'/api/users/{not_followed}/subscribe/',
+                 True, None),
+            Case('unsubscribe', 'delete', f'/api/users/{followed}/subscribe/',
+                 True, None),
+        ]
+
+    def get_client(self, auth):
+        client = APIClient()
+        if auth:
+            token, _ = Token.objects.get_or_create(user=self.user)
+            client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+        return client
+
+    def check_parity(self):
+        """
+        Сравнение ответов списков рецептов, собранных без сериализаторов
+        DRF, с ответами RecipeSerializer.
+        """
+        errors = []
+        for auth in (False, True):
+            client = self.get_client(auth)
+            for path in PARITY_PATHS:
+                responses = []
+                for fast_path in (True, False):
+                    with override_settings(RECIPE_LIST_FAST_PATH=fast_path):
+                        response = client.get(path)
+                    responses.append((response.status_code, response.json()))
+                if responses[0] != responses[1]:
+                    errors.append(f'{path}: ответы RecipeRowSerializer и '
+                                  'RecipeSerializer не совпадают')
+        if not errors:
+            self.stdout.write('Ответы списков рецептов совпадают')
+        return errors
+
+    def compare_renderers(self, iterations):
+        """
+        Замер времени рендеринга страницы рецептов
+        стандартным JSONRenderer и FastJSONRenderer.
+        """
+        data = self.get_client(True).get('/api/recipes/?limit=100').data
+        outputs = {}
+        for renderer_class in (JSONRenderer, FastJSONRenderer):
+            renderer = renderer_class()
+            timings = []
+            for _ in range(iterations):
+                started = time.perf_counter()
+                outputs[renderer_class] = renderer.render(
+                    data, 'application/json', {})
+                timings.append((time.perf_counter() - started) * 1000)
+            self.stdout.write(
+                f'{renderer_class.__name__:<28} '
+                f'p50 {statistics.median(timings):>9.3f} ms  '
+                f'p95 {percentile(timings, 95):>9.3f} ms  '
+                f'{len(outputs[renderer_class])} байт'
+            )
+        if orjson is None:
+            self.stdout.write('orjson не установлен, FastJSONRenderer '
+                              'использует стандартный JSONRenderer')
+        if outputs[JSONRenderer] != outputs[FastJSONRenderer]:
+            raise CommandError('Ответы рендереров не совпадают')
+
+    def measure(self, case, iterations):
+        """
+        Выполнение запроса iterations раз.
+        Изменения в базе откатываются после каждого запроса.
+        """
+        client = self.get_client(case.auth)
+        timings, queries, status, size = [], 0, 0, 0
+        for iteration in range(iterations + 1):
+            with transaction.atomic():
+                with CaptureQueriesContext(connection) as context:
+                    started = time.perf_counter()
+                    response = getattr(client, case.method)(
+                        case.path, case.data, format='json')
+                    if response.streaming:
+                        content = b''.join(response.streaming_content)
+                    else:
+                        content = response.content
+                    elapsed = time.perf_counter() - started
+                transaction.set_rollback(True)
+            if iteration == 0:
+                continue
+            timings.append(elapsed * 1000)
+            queries = max(queries, len(context))
+            status = max(status, response.status_code)
+            size = max(size, len(content))
+        return {
+            'status': status,
+            'queries': queries,
+            'size': size,
+            'p50_ms': round(statistics.median(timings), 2),
+            'p95_ms': round(percentile(timings, 95), 2),
+        }
+
+    def print_result(self, name, result):
+        self.stdout.write(
+            f'{name:<28} HTTP {result["status"]:<4} '
+            f'p50 {result["p50_ms"]:>9.2f} ms  '
+            f'p95 {result["p95_ms"]:>9.2f} ms  '
+            f'запросов {result["queries"]:<4} '
+            f'байт {result["size"]}'
+        )
+
+    def save_baseline(self, path, results):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as baseline:
+            json.dump(results, baseline, indent=2, sort_keys=True)
+        self.stdout.write(self.style.SUCCESS(f'Базовая линия: {path}'))
+
+    def compare(self, path, results, tolerance, size_tolerance):
+        """
+        Сравнение результатов с базовой линией.
+        Число запросов не должно расти, размер ответа — не более
+        чем на size_tolerance. Рост p95 больше чем на tolerance
+        выводится как предупреждение: время зависит от машины.
+        """
+        with open(path, encoding='utf-8') as baseline:
+            baseline = json.load(baseline)
+        errors = []
+        for name, result in results.items():
+            expected = baseline.get(name)
+            if expected is None:
+                continue
+            if result['queries'] > expected['queries']:
+                errors.append(
+                    f'{name}: запросов {result["queries"]}, '
+                    f'было {expected["queries"]}')
+            if result['size'] > expected['size'] * (1 + size_tolerance):
+                errors.append(
+                    f'{name}: размер ответа {result["size"]} байт, '
+                    f'было {expected["size"]} байт')
+            if result['p95_ms'] > expected['p95_ms'] * (1 + tolerance):
+                self.stdout.write(self.style.WARNING(
+                    f'{name}: p95 {result["p95_ms"]} ms, '
+                    f'было {expected["p95_ms"]} ms'))
+        return errors
+
+
+def percentile(values, percent):
+    """
+    Вычисление перцентиля с линейной интерполяцией.
+    """
+    values = sorted(values)
+    position = (len(values) - 1) * percent / 100
+    lower = int(position)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (
+        position - lower)
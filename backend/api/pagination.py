@@ -1,8 +1,23 @@
 """"
 Создание пагинатора.
 """
+import binascii
+import hashlib
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from collections import OrderedDict
+from datetime import datetime
+
 from django.conf import settings
-from rest_framework.pagination import PageNumberPagination
+from django.core.cache import cache
+from django.core.exceptions import EmptyResultSet
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Q
+from django.utils.functional import cached_property
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
 
 
 class CustomPagination(PageNumberPagination):
@@ -11,3 +26,149 @@ class CustomPagination(PageNumberPagination):
     """
     page_size = settings.PAGE_SIZE
     page_size_query_param = 'limit'
+
+
+def estimate_count(queryset):
+    """
+    Метод получения оценки числа строк таблицы из статистики PostgreSQL.
+    Для остальных баз данных возвращает None.
+    """
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT reltuples FROM pg_class WHERE oid = %s::regclass',
+            [connection.ops.quote_name(queryset.model._meta.db_table)],
+        )
+        row = cursor.fetchone()
+    if row is None or row[0] < 0:
+        return None
+    return int(row[0])
+
+
+class CachedCountPaginator(Paginator):
+    """
+    Пагинатор с кэшированием числа объектов.
+    Для выборок без фильтров число берется из статистики таблицы,
+    для остальных кэшируется по тексту запроса на короткое время.
+    """
+    count_estimated = False
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not queryset.query.has_filters():
+            estimate = estimate_count(queryset)
+            if (estimate is not None
+                    and estimate >= settings.PAGINATION_ESTIMATE_THRESHOLD):
+                self.count_estimated = True
+                return estimate
+        try:
+            sql, params = queryset.query.sql_with_params()
+        except EmptyResultSet:
+            return 0
+        key = 'pagination_count:' + hashlib.sha256(
+            f'{sql}{params}'.encode()).hexdigest()
+        count = cache.get(key)
+        if count is None:
+            count = queryset.count()
+            cache.set(key, count, settings.PAGINATION_COUNT_CACHE_TIMEOUT)
+        return count
+
+
+class CachedCountPagination(CustomPagination):
+    """
+    Пагинатор с кэшированным или оценочным числом объектов.
+    Поле count_estimated ответа показывает, что число объектов
+    является оценкой, а не точным значением.
+    """
+    django_paginator_class = CachedCountPaginator
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('count', self.page.paginator.count),
+            ('count_estimated', self.page.paginator.count_estimated),
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]))
+
+
+class RecipeCursorPagination(CursorPagination):
+    """
+    Постраничный вывод рецептов по ключу (pub_date, id).
+    Следующая страница выбирается условием по ключу последнего
+    рецепта страницы, без OFFSET и подсчета общего числа рецептов,
+    поэтому новые рецепты не сдвигают уже полученные страницы.
+    """
+    page_size = settings.PAGE_SIZE
+    page_size_query_param = 'limit'
+    ordering = ('-pub_date', '-id')
+    key_field = 'id'
+    invalid_cursor_message = 'Неверный курсор.'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        queryset = queryset.order_by(*self.ordering)
+        position = self.decode_cursor(request)
+        if position is not None:
+            pub_date, pk = position
+            queryset = queryset.filter(
+                Q(pub_date__lt=pub_date)
+                | Q(pub_date=pub_date, **{f'{self.key_field}__lt': pk}))
+        page = list(queryset[:self.page_size + 1])
+        self.has_next = len(page) > self.page_size
+        self.page = page[:self.page_size]
+        return self.page
+
+    def decode_cursor(self, request):
+        """
+        Метод получения ключа последнего рецепта из курсора.
+        """
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            pub_date, pk = urlsafe_b64decode(
+                encoded.encode()).decode().split('|')
+            return datetime.fromisoformat(pub_date), int(pk)
+        except (binascii.Error, UnicodeDecodeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, recipe):
+        """
+        Метод создания ссылки на страницу после рецепта.
+        Рецепт может быть объектом модели или строкой .values().
+        """
+        if isinstance(recipe, dict):
+            pub_date, pk = recipe['pub_date'], recipe[self.key_field]
+        else:
+            pub_date, pk = recipe.pub_date, getattr(recipe, self.key_field)
+        position = f'{pub_date.isoformat()}|{pk}'
+        return replace_query_param(
+            self.base_url, self.cursor_query_param,
+            urlsafe_b64encode(position.encode()).decode())
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        return self.encode_cursor(self.page[-1])
+
+    def get_previous_link(self):
+        return None
+
+    def get_first_link(self):
+        return remove_query_param(self.base_url, self.cursor_query_param)
+
+
+class FeedCursorPagination(RecipeCursorPagination):
+    """
+    Постраничный вывод записей ленты по ключу (pub_date, recipe_id)
+    в порядке индекса feed_user_pub_date_idx.
+    Курсоры совместимы с RecipeCursorPagination.
+    """
+    ordering = ('-pub_date', '-recipe_id')
+    key_field = 'recipe_id'
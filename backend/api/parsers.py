@@ -0,0 +1,46 @@
+"""
+Парсеры тела запросов API.
+"""
+import io
+from http import HTTPStatus
+
+from django.conf import settings
+from rest_framework.exceptions import APIException
+from rest_framework.parsers import JSONParser
+
+
+class RequestBodyTooLarge(APIException):
+    status_code = HTTPStatus.REQUEST_ENTITY_TOO_LARGE
+    default_detail = 'Размер тела запроса превышает допустимый.'
+    default_code = 'request_too_large'
+
+
+def content_length(request):
+    """
+    Метод получения размера тела запроса из заголовка Content-Length.
+    Некорректное значение считается нулем: тело все равно читается
+    не больше допустимого размера.
+    """
+    try:
+        return int(request.META.get('CONTENT_LENGTH') or 0)
+    except (ValueError, TypeError):
+        return 0
+
+
+class LimitedJSONParser(JSONParser):
+    """
+    Парсер JSON с ограничением размера тела запроса
+    API_JSON_MAX_BODY_SIZE. Размер проверяется по заголовку
+    Content-Length до чтения тела, а из потока читается
+    не больше допустимого числа байт.
+    """
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        limit = settings.API_JSON_MAX_BODY_SIZE
+        request = (parser_context or {}).get('request')
+        if request is not None and content_length(request) > limit:
+            raise RequestBodyTooLarge()
+        body = stream.read(limit + 1)
+        if len(body) > limit:
+            raise RequestBodyTooLarge()
+        return super().parse(io.BytesIO(body), media_type, parser_context)
@@ -0,0 +1,33 @@
+"""
+Рендереры ответов API.
+"""
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    Рендерер JSON на основе orjson.
+    Если orjson не установлен или клиент запросил отступы,
+    используется стандартный JSONRenderer. Вывод совпадает
+    с JSONRenderer при настройках UNICODE_JSON и COMPACT_JSON.
+    """
+    encoder_default = JSONEncoder().default
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if (orjson is None or data is None
+                or self.get_indent(accepted_media_type or '',
+                                   renderer_context or {})):
+            return super().render(
+                data, accepted_media_type, renderer_context)
+        return orjson.dumps(
+            data,
+            default=self.encoder_default,
+            option=orjson.OPT_NON_STR_KEYS | orjson.OPT_UTC_Z,
+        ).replace(b'\xe2\x80\xa8', b'\\u2028').replace(
+            b'\xe2\x80\xa9', b'\\u2029')
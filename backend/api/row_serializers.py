@@ -0,0 +1,127 @@
+"""
+Быстрое представление списков рецептов.
+Ответ собирается из строк .values() и словарей связанных объектов
+без вложенных сериализаторов DRF, формат совпадает с RecipeSerializer.
+"""
+from collections import defaultdict
+
+from django.db.models import BooleanField, Exists, OuterRef, Value
+from recipes.images import thumbnail_urls
+from recipes.models import IngredientRecipe, Recipe, Subscribe, TagRecipe
+from users.models import User
+
+RECIPE_ROW_FIELDS = (
+    'id', 'author_id', 'name', 'image', 'thumbnails', 'text', 'cooking_time',
+    'pub_date', 'is_favorited', 'is_in_shopping_cart',
+)
+
+
+class RecipeRowSerializer:
+    """
+    Представление списка рецептов из строк с полями RECIPE_ROW_FIELDS.
+    Авторы, теги и продукты рецептов загружаются тремя запросами
+    на весь список.
+    """
+
+    def __init__(self, rows, request=None):
+        self.rows = rows
+        self.request = request
+        self.storage = Recipe._meta.get_field('image').storage
+
+    def get_authors(self, author_ids):
+        """
+        Метод получения авторов с признаком подписки по id.
+        """
+        user = self.request.user if self.request else None
+        if user is None or user.is_anonymous:
+            is_subscribed = Value(False, output_field=BooleanField())
+        else:
+            is_subscribed = Exists(Subscribe.objects.filter(
+                user=user, following=OuterRef('pk')))
+        return {
+            author_id: {
+                'id': author_id,
+                'username': username,
+                'email': email,
+                'first_name': first_name,
+                'last_name': last_name,
+                'is_subscribed': subscribed,
+            }
+            for (author_id, username, email, first_name, last_name,
+                 subscribed) in User.objects.filter(
+                id__in=author_ids,
+            ).annotate(is_subscribed=is_subscribed).values_list(
+                'id', 'username', 'email', 'first_name', 'last_name',
+                'is_subscribed')
+        }
+
+    def get_tags(self, recipe_ids):
+        """
+        Метод получения тегов рецептов по id рецепта.
+        """
+        tags = defaultdict(list)
+        for recipe_id, tag_id, name, color, slug in TagRecipe.objects.filter(
+            recipe_id__in=recipe_ids,
+        ).order_by('tag_id').values_list(
+                'recipe_id', 'tag_id', 'tag__name', 'tag__color',
+                'tag__slug'):
+            tags[recipe_id].append(
+                {'id': tag_id, 'name': name, 'color': color, 'slug': slug})
+        return tags
+
+    def get_ingredients(self, recipe_ids):
+        """
+        Метод получения продуктов рецептов по id рецепта.
+        """
+        ingredients = defaultdict(list)
+        for recipe_id, ingredient_id, name, unit, amount in (
+            IngredientRecipe.objects.filter(
+                recipe_id__in=recipe_ids,
+            ).order_by('id').values_list(
+                'recipe_id', 'ingredient_id', 'ingredient__name',
+                'ingredient__measurement_unit', 'amount')
+        ):
+            ingredients[recipe_id].append({
+                'id': ingredient_id,
+                'name': name,
+                'measurement_unit': unit,
+                'amount': amount,
+            })
+        return ingredients
+
+    def get_image(self, name):
+        """
+        Метод получения ссылки на изображение как в ImageField DRF.
+        """
+        if not name:
+            return None
+        url = self.storage.url(name)
+        if self.request is not None:
+            return self.request.build_absolute_uri(url)
+        return url
+
+    @property
+    def data(self):
+        rows = list(self.rows)
+        if not rows:
+            return []
+        recipe_ids = [row['id'] for row in rows]
+        authors = self.get_authors({row['author_id'] for row in rows})
+        tags = self.get_tags(recipe_ids)
+        ingredients = self.get_ingredients(recipe_ids)
+        return [
+            {
+                'id': row['id'],
+                'author': authors[row['author_id']],
+                'name': row['name'],
+                'image': self.get_image(row['image']),
+                'thumbnails': thumbnail_urls(row['thumbnails'], self.request),
+                'text': row['text'],
+                'ingredients': ingredients[row['id']],
+                'tags': tags[row['id']],
+                'cooking_time': row['cooking_time'],
+                'is_in_shopping_cart': row['is_in_shopping_cart'],
+                'is_favorited': row['is_favorited'],
+            }
+            for row in rows
+        ]
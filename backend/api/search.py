@@ -0,0 +1,197 @@
+"""
+Полнотекстовый поиск рецептов.
+В PostgreSQL поиск выполняется по столбцу search_vector с GIN индексом,
+для остальных баз данных используется инвертированный индекс
+в памяти процесса.
+"""
+import bisect
+import re
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.contrib.postgres.aggregates import StringAgg
+from django.contrib.postgres.search import (SearchQuery, SearchRank,
+                                            SearchVector)
+from django.db import connections
+from django.db.models import (Case, F, FloatField, OuterRef, Subquery,
+                              TextField, Value, When)
+from django.db.models.functions import Coalesce
+from recipes.models import IngredientRecipe, Recipe
+
+from .cache import bump_version, get_version
+
+SEARCH_CONFIG = 'russian'
+BATCH_SIZE = 1000
+TOKEN_PATTERN = re.compile(r'\w+')
+FIELD_WEIGHTS = {
+    'name': 1.0,
+    'ingredients': 0.4,
+    'text': 0.2,
+}
+
+
+def is_postgresql(using='default'):
+    return connections[using].vendor == 'postgresql'
+
+
+def search_vector():
+    """
+    Выражение поискового вектора рецепта: название важнее
+    продуктов рецепта, продукты важнее описания.
+    """
+    ingredient_names = Subquery(
+        IngredientRecipe.objects.filter(recipe=OuterRef('pk'))
+        .order_by().values('recipe')
+        .annotate(names=StringAgg('ingredient__name', ' '))
+        .values('names'),
+        output_field=TextField(),
+    )
+    return (
+        SearchVector('name', weight='A', config=SEARCH_CONFIG)
+        + SearchVector(
+            Coalesce(ingredient_names, Value(''), output_field=TextField()),
+            weight='B', config=SEARCH_CONFIG)
+        + SearchVector('text', weight='C', config=SEARCH_CONFIG)
+    )
+
+
+def update_search_index(recipe_ids=None):
+    """
+    Обновление поискового вектора рецептов с id из recipe_ids
+    или всех рецептов. Для остальных баз данных сбрасывается
+    индекс в памяти процесса.
+    """
+    if not is_postgresql():
+        bump_version('recipe_search')
+        return
+    recipes = Recipe.objects.all()
+    if recipe_ids is not None:
+        recipes = recipes.filter(id__in=recipe_ids)
+    recipes.update(search_vector=search_vector())
+
+
+def tokenize(text):
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+class RecipeSearchIndex:
+    """
+    Инвертированный индекс рецептов в памяти процесса.
+    Для каждого слова хранится вес поля рецепта, в котором оно
+    встречается. Слова запроса ищутся по началу слова, рецепт
+    должен содержать все слова запроса.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.words = ()
+        self.postings = {}
+        self.version = None
+        self.built_at = None
+
+    def is_stale(self, version):
+        return (
+            self.built_at is None
+            or self.version != version
+            or time.monotonic() - self.built_at
+            > settings.RECIPE_SEARCH_INDEX_TTL
+        )
+
+    def build(self, version):
+        """
+        Метод построения индекса двумя запросами к базе.
+        """
+        built_at = time.monotonic()
+        postings = defaultdict(dict)
+
+        def add(recipe_id, text, weight):
+            for word in tokenize(text):
+                if postings[word].get(recipe_id, 0) < weight:
+                    postings[word][recipe_id] = weight
+
+        for recipe_id, name, text in Recipe.objects.values_list(
+                'id', 'name', 'text').iterator():
+            add(recipe_id, name, FIELD_WEIGHTS['name'])
+            add(recipe_id, text, FIELD_WEIGHTS['text'])
+        for recipe_id, name in IngredientRecipe.objects.values_list(
+                'recipe_id', 'ingredient__name').iterator():
+            add(recipe_id, name, FIELD_WEIGHTS['ingredients'])
+        self.words = tuple(sorted(postings))
+        self.postings = dict(postings)
+        self.version = version
+        self.built_at = built_at
+
+    def refresh(self):
+        version = get_version('recipe_search')
+        if self.is_stale(version):
+            with self.lock:
+                if self.is_stale(version):
+                    self.build(version)
+
+    def match(self, prefix):
+        """
+        Метод получения весов рецептов для слов, начинающихся с prefix.
+        """
+        scores = {}
+        position = bisect.bisect_left(self.words, prefix)
+        while (position < len(self.words)
+               and self.words[position].startswith(prefix)):
+            for recipe_id, weight in self.postings[
+                    self.words[position]].items():
+                scores[recipe_id] = max(scores.get(recipe_id, 0), weight)
+            position += 1
+        return scores
+
+    def search(self, query):
+        """
+        Метод поиска рецептов.
+        Возвращает словарь рейтингов по id рецепта.
+        """
+        self.refresh()
+        result = None
+        for word in set(tokenize(query)):
+            scores = self.match(word)
+            if result is None:
+                result = scores
+                continue
+            result = {
+                recipe_id: score + scores[recipe_id]
+                for recipe_id, score in result.items()
+                if recipe_id in scores
+            }
+        return result or {}
+
+
+recipe_search_index = RecipeSearchIndex()
+
+
+def search_recipes(queryset, query):
+    """
+    Метод фильтрации рецептов по поисковому запросу
+    с сортировкой по релевантности. Для индекса в памяти
+    рейтинг задается выражением CASE с ветками по значению
+    рейтинга и пакетами id рецептов.
+    """
+    if is_postgresql(queryset.db):
+        search_query = SearchQuery(
+            query, config=SEARCH_CONFIG, search_type='websearch')
+        return queryset.filter(search_vector=search_query).annotate(
+            search_rank=SearchRank(F('search_vector'), search_query),
+        ).order_by('-search_rank', '-pub_date', '-id')
+    scores = recipe_search_index.search(query)
+    if not scores:
+        return queryset.none()
+    recipes_by_score = defaultdict(list)
+    for recipe_id, score in scores.items():
+        recipes_by_score[score].append(recipe_id)
+    return queryset.filter(id__in=scores).annotate(
+        search_rank=Case(
+            *[When(id__in=recipe_ids[start:start + BATCH_SIZE],
+                   then=Value(score))
+              for score, recipe_ids in recipes_by_score.items()
+              for start in range(0, len(recipe_ids), BATCH_SIZE)],
+            output_field=FloatField(),
+        ),
+    ).order_by('-search_rank', '-pub_date', '-id')
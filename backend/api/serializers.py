@@ -1,13 +1,20 @@
 """
 Создание сериализаторов.
 """
+from django.conf import settings
+from django.db import transaction
 from djoser.serializers import UserCreateSerializer
-from drf_extra_fields.fields import Base64ImageField
+from recipes.images import (schedule_image_processing,
+                            schedule_replaced_files_deletion, thumbnail_urls)
 from recipes.models import (Cart, Favorite, Ingredient, IngredientRecipe,
                             Recipe, Subscribe, Tag, TagRecipe)
+from recipes.shopping_list import change_recipe_ingredients, lock_recipes
 from rest_framework import serializers
 from users.models import User
 
+from .fields import StreamingBase64ImageField
+from .search import update_search_index
+
 
 class CommonSubscribed(metaclass=serializers.SerializerMetaclass):
     """
@@ -19,6 +26,9 @@ class CommonSubscribed(metaclass=serializers.SerializerMetaclass):
         """
         Метод обработки параметра is_subscribed подписок.
         """
+        is_subscribed = getattr(obj, 'is_subscribed', None)
+        if is_subscribed is not None:
+            return is_subscribed
         request = self.context.get('request')
         if request.user.is_anonymous:
             return False
@@ -38,21 +48,31 @@ class CommonRecipe(metaclass=serializers.SerializerMetaclass):
         """
         Метод обработки параметра is_favorited избранного.
         """
-        request = self.context.get('request')
-        if request.user.is_anonymous:
-            return False
-        return Favorite.objects.filter(
-            user=request.user, recipe__id=obj.id).exists()
+        return self.get_user_flag(obj, 'is_favorited', Favorite)
 
     def get_is_in_shopping_cart(self, obj):
         """
         Метод обработки параметра is_in_shopping_cart в корзине.
         """
+        return self.get_user_flag(obj, 'is_in_shopping_cart', Cart)
+
+    def get_user_flag(self, obj, name, model):
+        """
+        Метод получения признака рецепта для пользователя.
+        Значение берется из аннотации запроса, а при ее отсутствии
+        из множества id рецептов, загружаемого один раз на запрос.
+        """
+        flag = getattr(obj, name, None)
+        if flag is not None:
+            return flag
         request = self.context.get('request')
         if request.user.is_anonymous:
             return False
-        return Cart.objects.filter(
-            user=request.user, recipe__id=obj.id).exists()
+        key = f'{name}_ids'
+        if key not in self.context:
+            self.context[key] = set(model.objects.filter(
+                user=request.user).values_list('recipe_id', flat=True))
+        return obj.id in self.context[key]
 
 
 class CommonCount(metaclass=serializers.SerializerMetaclass):
@@ -63,9 +83,10 @@ class CommonCount(metaclass=serializers.SerializerMetaclass):
 
     def get_recipes_count(self, obj):
         """
-        Метод подсчета количества рецептов автора.
+        Метод получения количества рецептов автора
+        из счетчика пользователя.
         """
-        return Recipe.objects.filter(author__id=obj.id).count()
+        return obj.recipes_count
 
 
 class RegistrationSerializer(UserCreateSerializer, CommonSubscribed):
@@ -132,6 +153,15 @@ class IngredientAmountSerializer(serializers.ModelSerializer):
         fields = ('id', 'name', 'measurement_unit', 'amount')
 
 
+class ShoppingListItemSerializer(serializers.Serializer):
+    """
+    Создание сериализатора строки списка покупок.
+    """
+    name = serializers.CharField(read_only=True)
+    measurement_unit = serializers.CharField(read_only=True)
+    amount = serializers.IntegerField(read_only=True)
+
+
 class IngredientAmountRecipeSerializer(serializers.ModelSerializer):
     """
     Создание сериализатора продуктов с количеством для записи.
@@ -163,16 +193,82 @@ class RecipeSerializer(serializers.ModelSerializer,
         source='ingredientrecipes',
         many=True)
     is_in_shopping_cart = serializers.SerializerMethodField()
+    thumbnails = serializers.SerializerMethodField()
 
     class Meta:
         """
         Мета параметры сериализатора модели рецептов.
         """
         model = Recipe
-        fields = ('id', 'author', 'name', 'image', 'text',
+        fields = ('id', 'author', 'name', 'image', 'thumbnails', 'text',
                   'ingredients', 'tags', 'cooking_time',
                   'is_in_shopping_cart', 'is_favorited')
 
+    def get_thumbnails(self, obj):
+        """
+        Метод получения ссылок на миниатюры изображения.
+        До завершения обработки изображения миниатюр нет.
+        """
+        return thumbnail_urls(obj.thumbnails, self.context.get('request'))
+
+
+class RecipeCoverageSerializer(RecipeSerializer):
+    """
+    Сериализатор рецептов, подобранных по имеющимся продуктам.
+    """
+    ingredients_covered = serializers.IntegerField(read_only=True)
+    ingredients_missing = serializers.IntegerField(read_only=True)
+
+    class Meta(RecipeSerializer.Meta):
+        """
+        Мета параметры сериализатора подобранных рецептов.
+        """
+        fields = RecipeSerializer.Meta.fields + (
+            'ingredients_covered', 'ingredients_missing')
+
+
+class RecipeCoverageQuerySerializer(serializers.Serializer):
+    """
+    Сериализатор параметров подбора рецептов по продуктам.
+    """
+    ingredients = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=settings.RECIPE_COVERAGE_MAX_INGREDIENTS,
+    )
+    max_missing = serializers.IntegerField(min_value=0, required=False)
+
+
+class RecipeIdsSerializer(serializers.Serializer):
+    """
+    Сериализатор списка id рецептов для массовых операций.
+    """
+    recipes = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=settings.BULK_RECIPES_MAX,
+    )
+
+
+class RecipeIdsDeleteSerializer(serializers.Serializer):
+    """
+    Сериализатор массового удаления: список id рецептов
+    или признак all для удаления всех рецептов пользователя.
+    """
+    recipes = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=settings.BULK_RECIPES_MAX,
+        required=False,
+    )
+    all = serializers.BooleanField(required=False)
+
+    def validate(self, data):
+        if ('recipes' in data) == data.get('all', False):
+            raise serializers.ValidationError(
+                'Укажите список рецептов recipes или all: true!')
+        return data
+
 
 class RecipeSerializerPost(serializers.ModelSerializer,
                            CommonRecipe):
@@ -185,7 +281,7 @@ class RecipeSerializerPost(serializers.ModelSerializer,
         many=True)
     ingredients = IngredientAmountRecipeSerializer(
         source='ingredientrecipes', many=True)
-    image = Base64ImageField(max_length=None, use_url=False,)
+    image = StreamingBase64ImageField(max_length=None, use_url=False,)
 
     class Meta:
         """
@@ -199,36 +295,32 @@ class RecipeSerializerPost(serializers.ModelSerializer,
     def validate(self, data):
         """
         Метод валидации продуктов в рецепте.
+        Наличие продуктов в базе проверяется одним запросом.
         """
-        ingredients_list = []
-        print(data)
         ingredients = data['ingredientrecipes']
+        ingredient_ids = []
         for ingredient in ingredients:
             if ingredient['amount'] == 0:
                 raise serializers.ValidationError(
                     'Количество должно быть больше 0!')
-            id_to_check = ingredient['ingredient']['id']
-            ingredient_to_check = Ingredient.objects.filter(id=id_to_check)
-            if not ingredient_to_check.exists():
-                raise serializers.ValidationError(
-                    'Данного продукта нет в базе!')
-            if ingredient_to_check in ingredients_list:
-                raise serializers.ValidationError(
-                    'Данные продукты повторяются в рецепте!')
-            ingredients_list.append(ingredient_to_check)
+            ingredient_ids.append(ingredient['ingredient']['id'])
+        if len(set(ingredient_ids)) != len(ingredient_ids):
+            raise serializers.ValidationError(
+                'Данные продукты повторяются в рецепте!')
+        if len(Ingredient.objects.in_bulk(ingredient_ids)) != len(
+                ingredient_ids):
+            raise serializers.ValidationError(
+                'Данного продукта нет в базе!')
 
         tags = data['tags']
         if not tags:
             raise serializers.ValidationError({
                 'Нужно выбрать хотя бы один тэг!'
             })
-        tags_list = []
-        for tag in tags:
-            if tag in tags_list:
-                raise serializers.ValidationError({
-                    'Тэги должны быть уникальными!'
-                })
-            tags_list.append(tag)
+        if len(set(tags)) != len(tags):
+            raise serializers.ValidationError({
+                'Тэги должны быть уникальными!'
+            })
 
         cooking_time = data['cooking_time']
         if int(cooking_time) <= 0:
@@ -237,64 +329,124 @@ class RecipeSerializerPost(serializers.ModelSerializer,
             })
         return data
 
-    def add_tags_and_ingredients(self, tags_data, ingredients, recipe):
+    def to_representation(self, instance):
         """
-        Метод выполнения общих функции
-        для создания и изменения рецептов.
+        Метод представления рецепта после создания или изменения
+        в формате сериализатора чтения рецептов.
         """
-        for tag_data in tags_data:
-            recipe.tags.add(tag_data)
-            recipe.save()
-        for ingredient in ingredients:
-            if not IngredientRecipe.objects.filter(
-                    ingredient_id=ingredient['ingredient']['id'],
-                    recipe=recipe).exists():
-                ingredientrecipe = IngredientRecipe.objects.create(
-                    ingredient_id=ingredient['ingredient']['id'],
-                    recipe=recipe)
-                ingredientrecipe.amount = ingredient['amount']
-                ingredientrecipe.save()
-            else:
-                IngredientRecipe.objects.filter(
-                    recipe=recipe).delete()
-                recipe.delete()
-                raise serializers.ValidationError(
-                    'Данные продукты повторяются в рецепте!')
-        return recipe
+        request = self.context.get('request')
+        instance = Recipe.objects.with_related(request.user).get(
+            pk=instance.pk)
+        return RecipeSerializer(instance, context=self.context).data
+
+    def set_tags(self, recipe, tags, created=False):
+        """
+        Метод записи тегов рецепта.
+        Изменяются только добавленные и удаленные теги.
+        """
+        new_ids = {tag.id for tag in tags}
+        old_ids = set() if created else set(
+            TagRecipe.objects.filter(recipe=recipe).values_list(
+                'tag_id', flat=True))
+        if old_ids - new_ids:
+            TagRecipe.objects.filter(
+                recipe=recipe, tag_id__in=old_ids - new_ids).delete()
+        TagRecipe.objects.bulk_create(
+            TagRecipe(recipe=recipe, tag_id=tag_id)
+            for tag_id in new_ids - old_ids
+        )
 
+    def set_ingredients(self, recipe, ingredients, created=False):
+        """
+        Метод записи продуктов рецепта.
+        Изменяются только добавленные, удаленные
+        и изменившие количество продукты, разница количеств
+        переносится в списки покупок. Строка рецепта
+        блокируется до чтения его продуктов.
+        """
+        if not created:
+            lock_recipes([recipe.id])
+        amounts = {
+            ingredient['ingredient']['id']: ingredient['amount']
+            for ingredient in ingredients
+        }
+        old_rows = {} if created else {
+            row.ingredient_id: row
+            for row in IngredientRecipe.objects.filter(recipe=recipe)
+        }
+        old_amounts = {
+            ingredient_id: row.amount
+            for ingredient_id, row in old_rows.items()
+        }
+        removed_ids = old_rows.keys() - amounts.keys()
+        if removed_ids:
+            IngredientRecipe.objects.filter(
+                recipe=recipe, ingredient_id__in=removed_ids).delete()
+        changed_rows = []
+        for ingredient_id, row in old_rows.items():
+            if ingredient_id in amounts and row.amount != amounts[
+                    ingredient_id]:
+                row.amount = amounts[ingredient_id]
+                changed_rows.append(row)
+        if changed_rows:
+            IngredientRecipe.objects.bulk_update(changed_rows, ['amount'])
+        IngredientRecipe.objects.bulk_create(
+            IngredientRecipe(
+                recipe=recipe, ingredient_id=ingredient_id, amount=amount)
+            for ingredient_id, amount in amounts.items()
+            if ingredient_id not in old_rows
+        )
+        if not created:
+            change_recipe_ingredients(recipe.id, {
+                ingredient_id: (amounts.get(ingredient_id, 0)
+                                - old_amounts.get(ingredient_id, 0))
+                for ingredient_id in amounts.keys() | old_amounts.keys()
+            })
+
+    def save(self, **kwargs):
+        """
+        Метод сохранения рецепта.
+        Временный файл загруженного изображения закрывается
+        после сохранения.
+        """
+        try:
+            return super().save(**kwargs)
+        finally:
+            image = self.validated_data.get('image')
+            if image is not None:
+                image.close()
+
+    @transaction.atomic
     def create(self, validated_data):
         """
         Метод создания рецептов.
         """
-        author = validated_data.get('author')
         tags_data = validated_data.pop('tags')
-        name = validated_data.get('name')
-        image = validated_data.get('image')
-        text = validated_data.get('text')
-        cooking_time = validated_data.get('cooking_time')
         ingredients = validated_data.pop('ingredientrecipes')
-        recipe = Recipe.objects.create(
-            author=author,
-            name=name,
-            image=image,
-            text=text,
-            cooking_time=cooking_time,
-        )
-        return self.add_tags_and_ingredients(tags_data, ingredients, recipe)
+        recipe = Recipe.objects.create(**validated_data)
+        self.set_tags(recipe, tags_data, created=True)
+        self.set_ingredients(recipe, ingredients, created=True)
+        update_search_index([recipe.id])
+        schedule_image_processing(recipe.id)
+        return recipe
 
+    @transaction.atomic
     def update(self, instance, validated_data):
         """
         Метод редактирования рецептов.
         """
         tags_data = validated_data.pop('tags')
         ingredients = validated_data.pop('ingredientrecipes')
-        TagRecipe.objects.filter(recipe=instance).delete()
-        IngredientRecipe.objects.filter(recipe=instance).delete()
-        instance = self.add_tags_and_ingredients(
-            tags_data, ingredients, instance)
-        super().update(instance, validated_data)
-        instance.save()
-        return instance
+        self.set_tags(instance, tags_data)
+        self.set_ingredients(instance, ingredients)
+        if 'image' in validated_data:
+            schedule_replaced_files_deletion(
+                instance.image.name, instance.thumbnails)
+            instance.thumbnails = {}
+            schedule_image_processing(instance.id)
+        recipe = super().update(instance, validated_data)
+        update_search_index([recipe.id])
+        return recipe
 
 
 class RecipeMinifieldSerializer(serializers.ModelSerializer):
@@ -329,12 +481,12 @@ class SubscriptionSerializer(serializers.ModelSerializer,
         """
         Метод получения данных рецептов автора,
         в зависимости от параметра recipes_limit.
-        """
-        request = self.context.get('request')
-        if request.GET.get('recipes_limit'):
-            recipes_limit = int(request.GET.get('recipes_limit'))
-            queryset = Recipe.objects.filter(author__id=obj.id).order_by('id')[
-                :recipes_limit]
-        else:
-            queryset = Recipe.objects.filter(author__id=obj.id).order_by('id')
-        return RecipeMinifieldSerializer(queryset, many=True).data
+        Рецепты берутся из контекста, подготовленного
+        для всей страницы подписок.
+        """
+        recipes = self.context.get('recipes')
+        if recipes is None:
+            recipes = Recipe.objects.previews(
+                [obj.id], self.context.get('recipes_limit'))
+        return RecipeMinifieldSerializer(
+            recipes.get(obj.id, []), many=True).data
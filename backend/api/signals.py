@@ -0,0 +1,113 @@
+"""
+Обработчики сигналов моделей для API.
+"""
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+from recipes.counters import change_counter
+from recipes.models import (Cart, Favorite, Ingredient, IngredientRecipe,
+                            Recipe, Subscribe, Tag)
+from users.models import User
+
+from .cache import bump_version
+from .search import is_postgresql, update_search_index
+from .utils import invalidate_shopping_cart
+
+
+@receiver((post_save, post_delete), sender=Cart)
+def cart_changed(sender, instance, **kwargs):
+    """
+    Сброс кэша списка покупок при изменении корзины пользователя.
+    """
+    invalidate_shopping_cart(instance.user_id)
+
+
+@receiver((post_save, post_delete), sender=Tag)
+def tag_changed(sender, instance, **kwargs):
+    """
+    Сброс кэша тегов при их изменении.
+    """
+    bump_version('tags')
+
+
+@receiver(pre_delete, sender=Ingredient)
+def ingredient_deleting(sender, instance, **kwargs):
+    """
+    Сохранение id рецептов с удаляемым продуктом до каскадного
+    удаления его строк в рецептах.
+    """
+    instance.search_recipe_ids = list(IngredientRecipe.objects.filter(
+        ingredient_id=instance.id).values_list('recipe_id', flat=True))
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+def ingredient_changed(sender, instance, signal, **kwargs):
+    """
+    Сброс кэша и индекса автодополнения продуктов при их изменении
+    и обновление поискового вектора рецептов с этим продуктом.
+    """
+    bump_version('ingredients')
+    if signal is post_delete:
+        update_search_index(instance.search_recipe_ids)
+        return
+    update_search_index(IngredientRecipe.objects.filter(
+        ingredient_id=instance.id).values('recipe_id'))
+
+
+@receiver(post_delete, sender=Recipe)
+def recipe_deleted(sender, instance, **kwargs):
+    """
+    Сброс индекса поиска в памяти процесса после удаления рецепта.
+    В PostgreSQL поисковый вектор удаляется вместе с рецептом.
+    """
+    if not is_postgresql():
+        bump_version('recipe_search')
+
+
+def counter_signal_delta(signal, created=False):
+    """
+    Метод получения изменения счетчика по сигналу:
+    1 при создании объекта, -1 при удалении и 0 при изменении.
+    """
+    if signal is post_delete:
+        return -1
+    return 1 if created else 0
+
+
+@receiver((post_save, post_delete), sender=Favorite)
+@receiver((post_save, post_delete), sender=Cart)
+def recipe_counter_changed(sender, instance, signal, created=False,
+                           **kwargs):
+    """
+    Изменение счетчиков добавлений рецепта в избранное и в корзину.
+    """
+    delta = counter_signal_delta(signal, created)
+    if delta:
+        change_counter(
+            Recipe.objects.filter(id=instance.recipe_id),
+            'carts_count' if sender is Cart else 'favorites_count', delta)
+
+
+@receiver((post_save, post_delete), sender=Recipe)
+def author_counter_changed(sender, instance, signal, created=False,
+                           **kwargs):
+    """
+    Изменение счетчика рецептов автора.
+    """
+    delta = counter_signal_delta(signal, created)
+    if delta:
+        change_counter(
+            User.objects.filter(id=instance.author_id),
+            'recipes_count', delta)
+
+
+@receiver((post_save, post_delete), sender=Subscribe)
+def followers_counter_changed(sender, instance, signal, created=False,
+                              **kwargs):
+    """
+    Изменение счетчика подписчиков автора.
+    """
+    delta = counter_signal_delta(signal, created)
+    if delta:
+        change_counter(
+            User.objects.filter(id=instance.following_id),
+            'followers_count', delta)
@@ -0,0 +1,511 @@
+"""
+Тесты API проекта Foodgram.
+"""
+import base64
+import io
+import json
+import os
+import re
+import tempfile
+
+from api.cache import bump_version, forget_version, get_version
+from api.fields import StreamingBase64ImageField, decoded_size
+from api.filters import RecipeFilters
+from api.management.commands.benchmark_api import BASELINE_PATH
+from api.parsers import LimitedJSONParser, RequestBodyTooLarge
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import connection, transaction
+from django.test import (RequestFactory, SimpleTestCase, TestCase,
+                         TransactionTestCase, override_settings,
+                         skipUnlessDBFeature)
+from django.test.utils import CaptureQueriesContext
+from PIL import Image
+from recipes.counters import find_drift, get_counters
+from recipes.feed import rebuild_feed
+from recipes.models import (Cart, Favorite, Ingredient, IngredientRecipe,
+                            Recipe, Subscribe, Tag, TagRecipe)
+from recipes.shopping_list import find_drift as find_list_drift
+from rest_framework import serializers
+from rest_framework.test import APIClient
+from users.models import User
+
+RECIPES_COUNT = 12
+
+
+def make_image(size=(40, 30), image_format='PNG'):
+    """
+    Метод создания изображения в памяти.
+    """
+    buffer = io.BytesIO()
+    Image.effect_noise(size, 50).convert('RGB').save(buffer, image_format)
+    return buffer.getvalue()
+
+
+class StreamingBase64ImageFieldTests(SimpleTestCase):
+    """
+    Тесты декодирования изображений из base64.
+    """
+
+    def decode(self, data):
+        upload = StreamingBase64ImageField().to_internal_value(data)
+        self.addCleanup(upload.close)
+        with open(upload.temporary_file_path(), 'rb') as file:
+            return upload, file.read()
+
+    def test_plain_input(self):
+        content = make_image()
+        upload, decoded = self.decode(
+            'data:image/png;base64,' + base64.b64encode(content).decode())
+        self.assertEqual(decoded, content)
+        self.assertEqual(upload.size, len(content))
+        self.assertTrue(upload.name.endswith('.png'))
+
+    @override_settings(RECIPE_IMAGE_DECODE_CHUNK_SIZE=10)
+    def test_wrapped_input(self):
+        content = make_image()
+        wrapped = base64.encodebytes(content).decode()
+        self.assertIn('\n', wrapped)
+        self.assertEqual(decoded_size(wrapped), len(content))
+        upload, decoded = self.decode(wrapped)
+        self.assertEqual(decoded, content)
+        self.assertEqual(upload.size, len(content))
+
+    @override_settings(RECIPE_IMAGE_DECODE_CHUNK_SIZE=10)
+    def test_whitespace_between_characters(self):
+        content = make_image()
+        encoded = base64.b64encode(content).decode()
+        spaced = ' \r\n'.join(
+            encoded[start:start + 7] for start in range(0, len(encoded), 7))
+        self.assertEqual(decoded_size(spaced), len(content))
+        self.assertEqual(self.decode(spaced)[1], content)
+
+    def test_invalid_input(self):
+        encoded = base64.b64encode(make_image()).decode()
+        for data in (encoded[:-1], encoded[:40] + '!' + encoded[40:],
+                     base64.b64encode(b'not an image').decode()):
+            with self.subTest(data=data[-10:]):
+                with self.assertRaises(serializers.ValidationError):
+                    StreamingBase64ImageField().to_internal_value(data)
+
+    def test_size_limits(self):
+        encoded = base64.encodebytes(make_image()).decode()
+        with override_settings(RECIPE_IMAGE_UPLOAD_MAX_BYTES=100):
+            with self.assertRaises(serializers.ValidationError):
+                StreamingBase64ImageField().to_internal_value(encoded)
+        with override_settings(RECIPE_IMAGE_UPLOAD_MAX_PIXELS=100):
+            with self.assertRaises(serializers.ValidationError):
+                StreamingBase64ImageField().to_internal_value(encoded)
+
+
+@override_settings(API_JSON_MAX_BODY_SIZE=16)
+class LimitedJSONParserTests(SimpleTestCase):
+    """
+    Ограничение размера тела JSON запроса.
+    """
+
+    def parse(self, body, content_length):
+        request = RequestFactory().post('/', body, 'application/json')
+        request.META['CONTENT_LENGTH'] = content_length
+        return LimitedJSONParser().parse(
+            io.BytesIO(body), parser_context={'request': request})
+
+    def test_malformed_content_length(self):
+        for content_length in ('abc', '', None):
+            with self.subTest(content_length=content_length):
+                self.assertEqual(self.parse(b'{"a": 1}', content_length),
+                                 {'a': 1})
+        with self.assertRaises(RequestBodyTooLarge):
+            self.parse(b'{"a": "' + b'x' * 16 + b'"}', 'abc')
+
+    def test_content_length_over_limit(self):
+        with self.assertRaises(RequestBodyTooLarge):
+            self.parse(b'{}', '17')
+
+
+class RecipeListTestCase(TestCase):
+    """
+    Общие данные тестов списка рецептов: рецепты нескольких авторов
+    с тегами и продуктами, подписка, избранное и корзина читателя.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.authors = [
+            User.objects.create_user(
+                username=f'author{number}', email=f'author{number}@test.ru',
+                first_name='Имя', last_name='Фамилия', password='password')
+            for number in range(3)
+        ]
+        cls.reader = User.objects.create_user(
+            username='reader', email='reader@test.ru',
+            first_name='Имя', last_name='Фамилия', password='password')
+        tags = [
+            Tag.objects.create(
+                name=f'Тег {number}', color=f'#00000{number}',
+                slug=f'tag{number}')
+            for number in range(3)
+        ]
+        ingredients = [
+            Ingredient.objects.create(
+                name=f'Продукт {number}', measurement_unit='г')
+            for number in range(5)
+        ]
+        for number in range(RECIPES_COUNT):
+            recipe = Recipe.objects.create(
+                author=cls.authors[number % 3], name=f'Рецепт {number}',
+                image=f'recipes/{number}.png', text='Описание',
+                cooking_time=number + 1)
+            TagRecipe.objects.bulk_create(
+                TagRecipe(recipe=recipe, tag=tag)
+                for tag in tags[:number % 3 + 1])
+            IngredientRecipe.objects.bulk_create(
+                IngredientRecipe(
+                    recipe=recipe, ingredient=ingredient, amount=10)
+                for ingredient in ingredients[:number % 5 + 1])
+            if not number:
+                recipe.thumbnails = {'small': 'recipes/thumbnails/0.webp'}
+                recipe.save(update_fields=['thumbnails'])
+            if number % 2:
+                Favorite.objects.create(user=cls.reader, recipe=recipe)
+            if number % 3:
+                Cart.objects.create(user=cls.reader, recipe=recipe)
+        Subscribe.objects.create(user=cls.reader, following=cls.authors[0])
+
+    def setUp(self):
+        cache.clear()
+
+    def client_for(self, user=None):
+        client = APIClient()
+        if user is not None:
+            client.force_authenticate(user)
+        return client
+
+
+class RecipeListQueryCountTests(RecipeListTestCase):
+    """
+    Число запросов к базе списка рецептов
+    не зависит от размера страницы. Числа указаны без запроса
+    оценки числа рецептов по статистике таблицы, который
+    выполняется только на PostgreSQL.
+    """
+    QUERIES = {
+        (True, False): 5,
+        (True, True): 5,
+        (False, False): 4,
+        (False, True): 5,
+    }
+
+    def test_query_count(self):
+        estimate_queries = int(connection.vendor == 'postgresql')
+        for (fast_path, authenticated), queries in self.QUERIES.items():
+            queries += estimate_queries
+            client = self.client_for(self.reader if authenticated else None)
+            for limit in (2, RECIPES_COUNT):
+                with self.subTest(fast_path=fast_path,
+                                  authenticated=authenticated, limit=limit):
+                    cache.clear()
+                    with override_settings(RECIPE_LIST_FAST_PATH=fast_path):
+                        with self.assertNumQueries(queries):
+                            response = client.get(
+                                f'/api/recipes/?limit={limit}')
+                    self.assertEqual(response.status_code, 200)
+                    self.assertEqual(len(response.data['results']), limit)
+
+
+class RecipeRowSerializerTests(RecipeListTestCase):
+    """
+    Быстрое представление списка рецептов совпадает
+    с ответом RecipeSerializer.
+    """
+
+    def get_results(self, client, fast_path):
+        with override_settings(RECIPE_LIST_FAST_PATH=fast_path):
+            response = client.get(f'/api/recipes/?limit={RECIPES_COUNT}')
+        self.assertEqual(response.status_code, 200)
+        return response.json()['results']
+
+    def test_same_output(self):
+        for user in (None, self.reader):
+            with self.subTest(user=user):
+                client = self.client_for(user)
+                rows = self.get_results(client, True)
+                self.assertEqual(rows, self.get_results(client, False))
+                self.assertEqual(len(rows), RECIPES_COUNT)
+                flags = [
+                    {row['is_favorited'] for row in rows},
+                    {row['is_in_shopping_cart'] for row in rows},
+                    {row['author']['is_subscribed'] for row in rows},
+                ]
+                expected = {False} if user is None else {False, True}
+                self.assertEqual(flags, [expected] * 3)
+
+
+class FeedTests(RecipeListTestCase):
+    """
+    Лента из записей FeedEntry совпадает с лентой,
+    выбранной по подпискам, на всех страницах.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        Subscribe.objects.create(user=cls.reader, following=cls.authors[1])
+        rebuild_feed()
+
+    def get_feed(self, query):
+        client = self.client_for(self.reader)
+        url, results = f'/api/recipes/feed/?limit=2{query}', []
+        while url:
+            response = client.get(url)
+            self.assertEqual(response.status_code, 200)
+            results += response.json()['results']
+            url = response.json()['next']
+        return results
+
+    def test_inbox_pages(self):
+        for query in ('', '&is_in_shopping_cart=1'):
+            for fast_path in (True, False):
+                with self.subTest(query=query, fast_path=fast_path):
+                    with override_settings(RECIPE_LIST_FAST_PATH=fast_path):
+                        with override_settings(FEED_INBOX=False):
+                            expected = self.get_feed(query)
+                        with override_settings(FEED_INBOX=True):
+                            self.assertEqual(self.get_feed(query), expected)
+                    self.assertTrue(expected)
+                    self.assertTrue(all(
+                        recipe['author']['id'] != self.authors[2].id
+                        for recipe in expected))
+
+
+class TagFilterTests(RecipeListTestCase):
+    """
+    Фильтр по тегам, которых нет в кэше словаря тегов.
+    """
+
+    def filter(self, cached_slugs, **data):
+        cache.clear()
+        filterset = RecipeFilters(data, queryset=Recipe.objects.all())
+        self.assertTrue(filterset.is_valid())
+        cache.set(f'tag_ids:{get_version("tags")}', dict(
+            Tag.objects.filter(slug__in=cached_slugs).values_list(
+                'slug', 'id')))
+        return filterset.qs
+
+    def test_missing_tags(self):
+        tags = ['tag1', 'tag2']
+        self.assertFalse(self.filter([], tags=tags).exists())
+        self.assertEqual(
+            set(self.filter(['tag1'], tags=tags)),
+            set(Recipe.objects.filter(tags__slug='tag1')))
+        self.assertFalse(
+            self.filter(['tag1'], tags=tags, tags_mode='all').exists())
+
+
+class BulkDeleteTests(RecipeListTestCase):
+    """
+    Массовое удаление выполняет одинаковое число запросов
+    при любом числе рецептов и не нарушает счетчики и списки покупок.
+    """
+
+    def delete(self, path, recipe_ids):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client_for(self.reader).delete(
+                path, {'recipes': recipe_ids}, format='json')
+        self.assertEqual(response.status_code, 200)
+        return len(context)
+
+    def test_query_count(self):
+        for path, model in (('/api/recipes/shopping_cart/', Cart),
+                            ('/api/recipes/favorite/', Favorite)):
+            with self.subTest(path=path):
+                recipe_ids = list(model.objects.filter(
+                    user=self.reader).values_list('recipe_id', flat=True))
+                self.assertGreater(len(recipe_ids), 2)
+                self.assertEqual(self.delete(path, recipe_ids[:1]),
+                                 self.delete(path, recipe_ids[1:]))
+                self.assertFalse(
+                    model.objects.filter(user=self.reader).exists())
+        counters = get_counters(Recipe, User, Favorite, Cart, Subscribe)
+        self.assertFalse(any(find_drift(counters).values()))
+        self.assertEqual(find_list_drift(), [])
+
+
+class SearchIndexTests(RecipeListTestCase):
+    """
+    Поисковый индекс обновляется один раз при изменении рецепта.
+    """
+
+    def test_update_reindexes_once(self):
+        recipe = Recipe.objects.get(name='Рецепт 0')
+        ingredient = Ingredient.objects.create(
+            name='Шафран', measurement_unit='г')
+        with CaptureQueriesContext(connection) as context:
+            response = self.client_for(self.authors[0]).patch(
+                f'/api/recipes/{recipe.id}/', {
+                    'name': 'Плов', 'text': 'Описание', 'cooking_time': 5,
+                    'tags': list(recipe.tags.values_list('id', flat=True)),
+                    'ingredients': [{'id': ingredient.id, 'amount': 5}],
+                }, format='json')
+        self.assertEqual(response.status_code, 200)
+        marker = ('"search_vector"' if connection.vendor == 'postgresql'
+                  else "'recipe_search'")
+        self.assertEqual(len([
+            query for query in context.captured_queries
+            if query['sql'].startswith('UPDATE') and marker in query['sql']
+        ]), 1)
+        client = self.client_for()
+        for word in ('Плов', 'Шафран'):
+            with self.subTest(word=word):
+                response = client.get('/api/recipes/', {'search': word})
+                self.assertEqual(
+                    [item['id'] for item in response.data['results']],
+                    [recipe.id])
+
+
+@skipUnlessDBFeature('has_select_for_update')
+class RecipeLockTests(RecipeListTestCase):
+    """
+    Корзина и изменение продуктов блокируют строку рецепта,
+    корзина — после строки пользователя.
+    """
+
+    def locked_tables(self, user, method, path, data):
+        with CaptureQueriesContext(connection) as context:
+            response = getattr(self.client_for(user), method)(
+                path, data, format='json')
+        self.assertLess(response.status_code, 300)
+        return [
+            re.search(r'FROM "(\w+)"', query['sql']).group(1)
+            for query in context.captured_queries
+            if 'FOR UPDATE' in query['sql']
+        ]
+
+    def test_cart_locks_user_then_recipe(self):
+        recipe = Recipe.objects.exclude(carts__user=self.reader).first()
+        self.assertEqual(
+            self.locked_tables(
+                self.reader, 'post',
+                f'/api/recipes/{recipe.id}/shopping_cart/', None),
+            ['users_user', 'recipes_recipe'])
+
+    def test_ingredient_edit_locks_recipe(self):
+        recipe = Recipe.objects.get(name='Рецепт 0')
+        self.assertEqual(
+            self.locked_tables(
+                self.authors[0], 'patch', f'/api/recipes/{recipe.id}/', {
+                    'name': 'Рецепт 0', 'text': 'Описание',
+                    'cooking_time': 1,
+                    'tags': list(recipe.tags.values_list('id', flat=True)),
+                    'ingredients': [{
+                        'id': Ingredient.objects.first().id, 'amount': 20,
+                    }],
+                }),
+            ['recipes_recipe'])
+
+
+class ReferenceVersionTests(TransactionTestCase):
+    """
+    Версии справочников: счетчик изменений в памяти процесса.
+    """
+
+    def setUp(self):
+        forget_version('tags')
+        cache.clear()
+
+    def test_version_is_counter(self):
+        version = get_version('tags')
+        bump_version('tags')
+        bump_version('tags')
+        self.assertEqual(get_version('tags'), version + 2)
+
+    def test_version_kept_in_memory(self):
+        get_version('tags')
+        with CaptureQueriesContext(connection) as context:
+            get_version('tags')
+        self.assertEqual(len(context.captured_queries), 0)
+        with override_settings(REFERENCE_VERSION_TTL=0):
+            with CaptureQueriesContext(connection) as context:
+                get_version('tags')
+        self.assertEqual(len(context.captured_queries), 1)
+
+    def test_tag_change_visible(self):
+        client = APIClient()
+        response = client.get('/api/tags/')
+        etag = response['ETag']
+        self.assertEqual(client.get(
+            '/api/tags/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        Tag.objects.create(name='Ужин', color='#00FF00', slug='dinner')
+        response = client.get('/api/tags/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(len(response.data), 1)
+
+
+class BenchmarkTests(TestCase):
+    """
+    Заполнение базы командой seed_data и прогон benchmark_api
+    с проверкой совпадения ответов и статусов всех эндпоинтов.
+    """
+
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        media_settings = override_settings(MEDIA_ROOT=media_root.name)
+        media_settings.enable()
+        self.addCleanup(media_settings.disable)
+        self.media_root = media_root.name
+        cache.clear()
+
+    def seed(self, seed=0):
+        call_command('seed_data', users=20, recipes=50, seed=seed,
+                     stdout=io.StringIO())
+
+    def test_benchmark(self):
+        """
+        Сохраненная базовая линия рассчитана на PostgreSQL
+        для данных seed_data --users 20 --recipes 50.
+        """
+        self.seed()
+        baseline = BASELINE_PATH
+        if connection.vendor != 'postgresql':
+            baseline = os.path.join(self.media_root, 'baseline.json')
+        output = io.StringIO()
+        call_command('benchmark_api', iterations=1, stdout=output,
+                     baseline=baseline)
+        self.assertIn('Ответы списков рецептов совпадают', output.getvalue())
+
+    def test_baseline_exceeded(self):
+        self.seed()
+        baseline = os.path.join(self.media_root, 'baseline.json')
+        options = {'iterations': 1, 'only': ['tags-detail'],
+                   'baseline': baseline, 'stdout': io.StringIO()}
+        call_command('benchmark_api', save_baseline=True, **options)
+        with open(baseline, encoding='utf-8') as file:
+            results = json.load(file)
+        call_command('benchmark_api', **options)
+        for field, message in (('queries', 'запросов'),
+                               ('size', 'размер ответа')):
+            with self.subTest(field=field):
+                exceeded = {'tags-detail': dict(
+                    results['tags-detail'],
+                    **{field: results['tags-detail'][field] // 2 - 1})}
+                with open(baseline, 'w', encoding='utf-8') as file:
+                    json.dump(exceeded, file)
+                with self.assertRaisesMessage(CommandError, message):
+                    call_command('benchmark_api', **options)
+
+    def test_seed_is_reproducible(self):
+        data = []
+        for _ in range(2):
+            with transaction.atomic():
+                self.seed(seed=1)
+                data.append((
+                    list(Ingredient.objects.order_by('id').values_list(
+                        'name', 'measurement_unit')),
+                    list(Recipe.objects.order_by('id').values_list(
+                        'text', 'cooking_time')),
+                ))
+                transaction.set_rollback(True)
+        self.assertEqual(data[0], data[1])
+        self.assertTrue(all(data[0]))
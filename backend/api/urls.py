@@ -6,8 +6,8 @@ from django.urls import include, path
 from rest_framework.routers import DefaultRouter
 
 from .views import (CartViewSet, CreateUserView, DownloadCart, FavoriteViewSet,
-                    IngredientViewSet, RecipeViewSet, SubscribeViewSet,
-                    TagViewSet)
+                    IngredientViewSet, RecipeViewSet, ShoppingListViewSet,
+                    SubscribeViewSet, TagViewSet)
 
 app_name = 'api'
 router = DefaultRouter()
@@ -28,11 +28,24 @@ urlpatterns = [
         DownloadCart.as_view({'get': 'download'}),
         name='download'
     ),
+    path(
+        'recipes/shopping_list/',
+        ShoppingListViewSet.as_view({'get': 'list'}),
+        name='shopping_list'
+    ),
     path(
         'users/<users_id>/subscribe/',
         SubscribeViewSet.as_view({'post': 'create', 'delete': 'delete'}),
         name='subscribe'
     ),
+    path('recipes/favorite/',
+         FavoriteViewSet.as_view({'post': 'create_many',
+                                  'delete': 'delete_many'}),
+         name='favorite_many'),
+    path('recipes/shopping_cart/',
+         CartViewSet.as_view({'post': 'create_many',
+                              'delete': 'delete_many'}),
+         name='cart_many'),
     path('recipes/<recipes_id>/favorite/',
          FavoriteViewSet.as_view({'post': 'create',
                                   'delete': 'delete'}), name='favorite'),
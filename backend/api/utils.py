@@ -1,41 +1,94 @@
-from django.http import HttpResponse
+import hashlib
+import io
+import json
+import os
+
+from django.conf import settings
+from django.core.cache import cache
 from reportlab.lib.pagesizes import A4
 from reportlab.pdfbase import pdfmetrics
 from reportlab.pdfbase.ttfonts import TTFont
 from reportlab.pdfgen import canvas
 
+FONT_NAME = 'FreeSans'
+
+
+def register_fonts():
+    """
+    Метод регистрации шрифта списка покупок.
+    Файл шрифта разбирается один раз на процесс.
+    """
+    if FONT_NAME not in pdfmetrics.getRegisteredFontNames():
+        pdfmetrics.registerFont(TTFont(FONT_NAME, settings.PDF_FONT_PATH))
+
 
-def canvas_method(dictionary):
+def font_is_available():
+    """
+    Метод проверки наличия файла шрифта.
+    """
+    return os.path.exists(settings.PDF_FONT_PATH)
+
+
+def canvas_method(dictionary, output):
     """
     Метод сохранения списка покупок в формате PDF.
     """
-    response = HttpResponse(content_type='application/pdf')
-    response[
-        'Content-Disposition'
-    ] = 'attachment; filename = "shopping_cart.pdf"'
+    register_fonts()
     begin_position_x, begin_position_y = 40, 650
-    sheet = canvas.Canvas(response, pagesize=A4)
-    pdfmetrics.registerFont(TTFont('FreeSans',
-                                   'data/FreeSans.ttf'))
-    sheet.setFont('FreeSans', 50)
+    sheet = canvas.Canvas(output, pagesize=A4)
+    sheet.setFont(FONT_NAME, 50)
     sheet.setTitle('Список покупок')
     sheet.drawString(
         begin_position_x,
         begin_position_y + 40, 'Список покупок: ')
-    sheet.setFont('FreeSans', 24)
+    sheet.setFont(FONT_NAME, 24)
     for number, item in enumerate(dictionary, start=1):
         if begin_position_y < 100:
             begin_position_y = 700
             sheet.showPage()
-            sheet.setFont('FreeSans', 24)
+            sheet.setFont(FONT_NAME, 24)
         sheet.drawString(
             begin_position_x,
             begin_position_y,
-            f'{number}.  {item["ingredient__name"]} - '
-            f'{item["ingredient_total"]}'
-            f' {item["ingredient__measurement_unit"]}'
+            f'{number}.  {item["name"]} - '
+            f'{item["amount"]} {item["measurement_unit"]}'
         )
         begin_position_y -= 30
     sheet.showPage()
     sheet.save()
-    return response
+    return output
+
+
+def shopping_cart_digest(rows):
+    """
+    Метод вычисления хэша содержимого списка покупок.
+    """
+    content = json.dumps(rows, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(content.encode()).hexdigest()
+
+
+def invalidate_shopping_cart(user_id):
+    """
+    Метод сброса закэшированного PDF списка покупок пользователя.
+    """
+    digest_key = f'shopping_cart_digest:{user_id}'
+    digest = cache.get(digest_key)
+    if digest is not None:
+        cache.delete_many([digest_key, f'shopping_cart_pdf:{digest}'])
+
+
+def render_shopping_cart(rows, user):
+    """
+    Метод получения PDF списка покупок из кэша
+    или его построения при отсутствии в кэше.
+    """
+    rows = list(rows)
+    digest = shopping_cart_digest(rows)
+    pdf_key = f'shopping_cart_pdf:{digest}'
+    content = cache.get(pdf_key)
+    if content is None:
+        content = canvas_method(rows, io.BytesIO()).getvalue()
+        cache.set(pdf_key, content, settings.SHOPPING_CART_CACHE_TIMEOUT)
+    cache.set(f'shopping_cart_digest:{user.id}', digest,
+              settings.SHOPPING_CART_CACHE_TIMEOUT)
+    return content
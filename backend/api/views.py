@@ -1,21 +1,39 @@
 from http import HTTPStatus
 
-from django.db.models import Sum
-from django.shortcuts import get_list_or_404, get_object_or_404
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import BooleanField, Value
+from django.shortcuts import get_object_or_404
 from django_filters.rest_framework import DjangoFilterBackend
 from djoser.views import UserViewSet
-from recipes.models import (Cart, Favorite, Ingredient, IngredientRecipe,
-                            Recipe, Subscribe, Tag)
-from rest_framework import permissions, viewsets
+from recipes.counters import change_counter
+from recipes.feed import (add_author_recipes, fan_out_recipe,
+                          remove_author_recipes)
+from recipes.models import (Cart, Favorite, FeedEntry, Ingredient, Recipe,
+                            Subscribe, Tag)
+from recipes.shopping_list import (add_cart_recipes, remove_cart_recipes,
+                                   remove_recipe, shopping_list_rows)
+from rest_framework import permissions, serializers, viewsets
+from rest_framework.decorators import action
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
 from users.models import User
 
-from .filters import IngredientSearchFilter, RecipeFilters
+from .autocomplete import search_ingredients
+from .cache import CachedListMixin
+from .exporters import SHOPPING_CART_EXPORTERS
+from .filters import RecipeFilters
+from .pagination import (CachedCountPagination, FeedCursorPagination,
+                         RecipeCursorPagination)
 from .permissions import AuthorOrAdmin, ReadOnly
-from .serializers import (IngredientSerializer, RecipeSerializer,
+from .row_serializers import RECIPE_ROW_FIELDS, RecipeRowSerializer
+from .serializers import (IngredientSerializer, RecipeCoverageQuerySerializer,
+                          RecipeCoverageSerializer, RecipeIdsDeleteSerializer,
+                          RecipeIdsSerializer, RecipeSerializer,
                           RecipeSerializerPost, RegistrationSerializer,
-                          SubscriptionSerializer, TagSerializer)
-from .utils import canvas_method
+                          ShoppingListItemSerializer, SubscriptionSerializer,
+                          TagSerializer)
+from .utils import invalidate_shopping_cart
 
 
 class CreateUserView(UserViewSet):
@@ -36,7 +54,39 @@ class SubscribeViewSet(viewsets.ModelViewSet):
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
-        return get_list_or_404(User, following__user=self.request.user)
+        return User.objects.filter(
+            following__user=self.request.user
+        ).annotate(
+            is_subscribed=Value(True, output_field=BooleanField()),
+        ).order_by('id')
+
+    def get_serializer_context(self):
+        """
+        Метод добавления параметра recipes_limit в контекст.
+        """
+        context = super().get_serializer_context()
+        recipes_limit = self.request.query_params.get('recipes_limit')
+        context['recipes_limit'] = (
+            int(recipes_limit) if recipes_limit
+            and recipes_limit.isdigit() else None
+        )
+        return context
+
+    def list(self, request, *args, **kwargs):
+        """
+        Метод получения списка подписок с рецептами авторов,
+        загружаемыми одним запросом для всей страницы.
+        """
+        queryset = self.get_queryset()
+        page = self.paginate_queryset(queryset)
+        authors = page if page is not None else queryset
+        context = self.get_serializer_context()
+        context['recipes'] = Recipe.objects.previews(
+            [author.id for author in authors], context['recipes_limit'])
+        serializer = self.get_serializer(authors, many=True, context=context)
+        if page is not None:
+            return self.get_paginated_response(serializer.data)
+        return Response(serializer.data)
 
     def create(self, request, *args, **kwargs):
         """
@@ -44,8 +94,10 @@ class SubscribeViewSet(viewsets.ModelViewSet):
         """
         user_id = self.kwargs.get('users_id')
         user = get_object_or_404(User, id=user_id)
-        Subscribe.objects.create(
-            user=request.user, following=user)
+        with transaction.atomic():
+            Subscribe.objects.create(
+                user=request.user, following=user)
+            add_author_recipes(request.user.id, user.id)
         return Response(HTTPStatus.CREATED)
 
     def delete(self, request, *args, **kwargs):
@@ -54,64 +106,201 @@ class SubscribeViewSet(viewsets.ModelViewSet):
         """
         author_id = self.kwargs['users_id']
         user_id = request.user.id
-        subscribe = get_object_or_404(
-            Subscribe, user__id=user_id, following__id=author_id)
-        subscribe.delete()
+        with transaction.atomic():
+            subscribe = get_object_or_404(
+                Subscribe.objects.select_for_update(),
+                user__id=user_id, following__id=author_id)
+            subscribe.delete()
+            remove_author_recipes(user_id, subscribe.following_id)
         return Response(HTTPStatus.NO_CONTENT)
 
 
-class TagViewSet(viewsets.ReadOnlyModelViewSet):
+class TagViewSet(CachedListMixin, viewsets.ReadOnlyModelViewSet):
     """
     Вьюсет обработки моделей тегов.
     """
+    cache_name = 'tags'
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
     pagination_class = None
 
 
-class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
+class IngredientViewSet(CachedListMixin, viewsets.ReadOnlyModelViewSet):
     """
     Вьюсет обработки моделей ингредиентов.
     """
+    cache_name = 'ingredients'
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
-    filter_backends = (DjangoFilterBackend, IngredientSearchFilter)
     pagination_class = None
-    search_fields = ['^name']
+
+    def list(self, request, *args, **kwargs):
+        """
+        Метод получения списка продуктов.
+        При переданном параметре name выполняется автодополнение:
+        сначала продукты, начинающиеся с name, затем содержащие его.
+        """
+        name = request.query_params.get('name')
+        if not name:
+            return super().list(request, *args, **kwargs)
+        return Response(search_ingredients(name))
 
 
 class RecipeViewSet(viewsets.ModelViewSet):
     """
     Вьюсет обработки моделей рецептов.
     """
-    queryset = Recipe.objects.all()
     permission_classes = [AuthorOrAdmin]
     filter_class = RecipeFilters
     filter_backends = [DjangoFilterBackend]
 
+    @property
+    def pagination_class(self):
+        """
+        Выбор пагинатора: лента подписок и запросы с параметром
+        cursor выводятся постранично по ключу.
+        """
+        if self.action in ('popular', 'cook'):
+            return CachedCountPagination
+        if self.action == 'feed' and settings.FEED_INBOX:
+            return FeedCursorPagination
+        if (self.action == 'feed'
+                or 'cursor' in self.request.query_params):
+            return RecipeCursorPagination
+        return CachedCountPagination
+
     def get_permissions(self):
         if self.action == "retrieve":
             return (ReadOnly(),)
+        if self.action == 'feed':
+            return (permissions.IsAuthenticated(),)
         return super().get_permissions()
 
+    def get_queryset(self):
+        """
+        Метод получения рецептов с признаками избранного
+        и корзины текущего пользователя.
+        """
+        if self.request.method == 'GET':
+            return Recipe.objects.with_related(self.request.user)
+        return Recipe.objects.with_user_flags(self.request.user)
+
+    def list(self, request, *args, **kwargs):
+        """
+        Метод получения списка рецептов.
+        """
+        return self.recipes_page(self.filter_queryset(self.get_queryset()))
+
+    def recipes_page(self, queryset):
+        """
+        Метод постраничного вывода рецептов.
+        При включенной настройке RECIPE_LIST_FAST_PATH страница
+        собирается из строк запроса без сериализаторов DRF.
+        """
+        if not settings.RECIPE_LIST_FAST_PATH:
+            page = self.paginate_queryset(queryset)
+            serializer = self.get_serializer(page, many=True)
+            return self.get_paginated_response(serializer.data)
+        page = self.paginate_queryset(
+            queryset.prefetch_related(None).values(*RECIPE_ROW_FIELDS))
+        return self.get_paginated_response(
+            RecipeRowSerializer(page, request=self.request).data)
+
     def perform_create(self, serializer):
         """
         Метод подстановки параметров автора при создании рецепта.
         """
-        serializer.save(author=self.request.user)
+        with transaction.atomic():
+            recipe = serializer.save(author=self.request.user)
+            fan_out_recipe(recipe)
+
+    def perform_destroy(self, instance):
+        """
+        Метод удаления рецепта и его продуктов из списков покупок.
+        Строка рецепта блокируется, чтобы параллельное удаление
+        не изменило списки покупок и счетчики повторно.
+        """
+        with transaction.atomic():
+            instance = get_object_or_404(
+                Recipe.objects.select_for_update(), id=instance.id)
+            remove_recipe(instance.id)
+            instance.delete()
 
     def get_serializer_class(self):
         """
         Метод выбора сериализатора в зависимости от запроса.
         """
+        if self.action == 'cook':
+            return RecipeCoverageSerializer
         if self.request.method == 'GET':
             return RecipeSerializer
         return RecipeSerializerPost
 
+    @action(detail=False)
+    def popular(self, request):
+        """
+        Метод получения популярных рецептов
+        из заранее рассчитанной таблицы рейтинга.
+        """
+        return self.recipes_page(self.filter_queryset(
+            self.get_queryset()).filter(popularity__isnull=False).order_by(
+            '-popularity__score', '-id'))
+
+    @action(detail=False)
+    def cook(self, request):
+        """
+        Метод подбора рецептов по имеющимся продуктам
+        с числом недостающих продуктов рецепта.
+        """
+        params = RecipeCoverageQuerySerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        queryset = self.filter_queryset(self.get_queryset()).by_ingredients(
+            params.validated_data['ingredients'])
+        if 'max_missing' in params.validated_data:
+            queryset = queryset.filter(
+                ingredients_missing__lte=params.validated_data['max_missing'])
+        page = self.paginate_queryset(queryset)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
+    @action(detail=False)
+    def feed(self, request):
+        """
+        Метод получения ленты рецептов авторов,
+        на которых подписан пользователь.
+        """
+        queryset = self.filter_queryset(self.get_queryset())
+        if settings.FEED_INBOX:
+            return self.feed_entries_page(queryset)
+        return self.recipes_page(queryset.feed(request.user))
+
+    def feed_entries_page(self, queryset):
+        """
+        Метод постраничного вывода ленты из записей FeedEntry.
+        Страница выбирается по индексу ленты пользователя,
+        рецепты загружаются только для записей страницы.
+        """
+        entries = FeedEntry.objects.filter(user=self.request.user)
+        if queryset.query.has_filters():
+            entries = entries.filter(recipe__in=queryset.values('id'))
+        page = self.paginate_queryset(entries.values('recipe_id', 'pub_date'))
+        recipes = self.get_queryset().filter(
+            id__in=[entry['recipe_id'] for entry in page],
+        ).order_by('-pub_date', '-id')
+        if settings.RECIPE_LIST_FAST_PATH:
+            data = RecipeRowSerializer(
+                recipes.prefetch_related(None).values(*RECIPE_ROW_FIELDS),
+                request=self.request).data
+        else:
+            data = self.get_serializer(recipes, many=True).data
+        return self.get_paginated_response(data)
+
 
 class BaseFavoriteCartViewSet(viewsets.ModelViewSet):
     """
     Базовый вьюсет обработки модели корзины и избранных рецептов.
+    Массовые операции возвращают статус по каждому рецепту:
+    created, exists, deleted или not_found.
     """
     permission_classes = [permissions.IsAuthenticated]
 
@@ -121,21 +310,121 @@ class BaseFavoriteCartViewSet(viewsets.ModelViewSet):
         """
         recipe_id = int(self.kwargs['recipes_id'])
         recipe = get_object_or_404(Recipe, id=recipe_id)
-        self.model.objects.create(
-            user=request.user, recipe=recipe)
+        try:
+            with transaction.atomic():
+                self.lock_user()
+                self.model.objects.create(
+                    user=request.user, recipe=recipe)
+                self.recipes_added([recipe.id])
+        except IntegrityError:
+            raise serializers.ValidationError('Рецепт уже добавлен!')
         return Response(HTTPStatus.CREATED)
 
+    def create_many(self, request, *args, **kwargs):
+        """
+        Метод добавления списка рецептов.
+        Рецепты проверяются одним запросом и добавляются одним
+        запросом INSERT, уже добавленные рецепты пропускаются.
+        """
+        serializer = RecipeIdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        recipe_ids = list(dict.fromkeys(serializer.validated_data['recipes']))
+        found = Recipe.objects.only('id').in_bulk(recipe_ids)
+        with transaction.atomic():
+            self.lock_user()
+            existing = set(self.model.objects.filter(
+                user=request.user, recipe_id__in=found).values_list(
+                'recipe_id', flat=True))
+            created = [
+                recipe_id for recipe_id in found if recipe_id not in existing
+            ]
+            self.model.objects.bulk_create((
+                self.model(user=request.user, recipe_id=recipe_id)
+                for recipe_id in created
+            ), ignore_conflicts=True)
+            self.update_counter(created, 1)
+            self.recipes_added(created)
+        statuses = dict.fromkeys(created, 'created')
+        statuses.update(dict.fromkeys(existing, 'exists'))
+        return Response({'recipes': [
+            {'id': recipe_id, 'status': statuses.get(recipe_id, 'not_found')}
+            for recipe_id in recipe_ids
+        ]})
+
     def delete(self, request, *args, **kwargs):
         """
         Метод удаления объектов модели корзины или избранных рецептов.
         """
         recipe_id = self.kwargs['recipes_id']
         user_id = request.user.id
-        object = get_object_or_404(
-            self.model, user__id=user_id, recipe__id=recipe_id)
-        object.delete()
+        with transaction.atomic():
+            self.lock_user()
+            object = get_object_or_404(
+                self.model.objects.select_for_update(),
+                user__id=user_id, recipe__id=recipe_id)
+            object.delete()
+            self.recipes_removed([object.recipe_id])
         return Response(HTTPStatus.NO_CONTENT)
 
+    def delete_many(self, request, *args, **kwargs):
+        """
+        Метод удаления списка рецептов одним запросом DELETE.
+        С признаком all удаляются все рецепты пользователя.
+        Записи удаляются без сигналов post_delete, счетчики
+        и список покупок изменяются один раз на весь список.
+        """
+        serializer = RecipeIdsDeleteSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        entries = self.model.objects.filter(user=request.user)
+        recipe_ids = serializer.validated_data.get('recipes')
+        if recipe_ids is not None:
+            recipe_ids = list(dict.fromkeys(recipe_ids))
+            entries = entries.filter(recipe_id__in=recipe_ids)
+        with transaction.atomic():
+            self.lock_user()
+            deleted = list(entries.select_for_update().values_list(
+                'recipe_id', flat=True))
+            removed = self.model.objects.filter(
+                user=request.user, recipe_id__in=deleted)
+            removed._raw_delete(removed.db)
+            self.update_counter(deleted, -1)
+            self.recipes_removed(deleted)
+        if recipe_ids is None:
+            recipe_ids = deleted
+        deleted = set(deleted)
+        return Response({'recipes': [
+            {'id': recipe_id,
+             'status': 'deleted' if recipe_id in deleted else 'not_found'}
+            for recipe_id in recipe_ids
+        ]})
+
+    def lock_user(self):
+        """
+        Блокировка строки пользователя до конца транзакции,
+        чтобы изменения его рецептов выполнялись по очереди.
+        """
+        User.objects.select_for_update().get(id=self.request.user.id)
+
+    def update_counter(self, recipe_ids, delta):
+        """
+        Метод изменения счетчика рецептов на delta для записей,
+        созданных или удаленных без сигналов модели.
+        """
+        if recipe_ids:
+            change_counter(
+                Recipe.objects.filter(id__in=recipe_ids),
+                self.counter_field, delta)
+
+    def recipes_added(self, recipe_ids):
+        """
+        Метод обработки добавления рецептов пользователем.
+        """
+
+    def recipes_removed(self, recipe_ids):
+        """
+        Метод обработки удаления рецептов пользователем.
+        """
+
 
 class CartViewSet(BaseFavoriteCartViewSet):
     """
@@ -144,6 +433,21 @@ class CartViewSet(BaseFavoriteCartViewSet):
     serializer_class = RecipeSerializer
     queryset = Cart.objects.all()
     model = Cart
+    counter_field = 'carts_count'
+
+    def recipes_added(self, recipe_ids):
+        """
+        Метод добавления продуктов рецептов в список покупок.
+        """
+        add_cart_recipes(self.request.user.id, recipe_ids)
+        invalidate_shopping_cart(self.request.user.id)
+
+    def recipes_removed(self, recipe_ids):
+        """
+        Метод удаления продуктов рецептов из списка покупок.
+        """
+        remove_cart_recipes(self.request.user.id, recipe_ids)
+        invalidate_shopping_cart(self.request.user.id)
 
 
 class FavoriteViewSet(BaseFavoriteCartViewSet):
@@ -153,20 +457,43 @@ class FavoriteViewSet(BaseFavoriteCartViewSet):
     serializer_class = RecipeSerializer
     queryset = Favorite.objects.all()
     model = Favorite
+    counter_field = 'favorites_count'
 
 
 class DownloadCart(viewsets.ModelViewSet):
     """
     Сохранение файла списка покупок.
+    Формат файла выбирается по заголовку Accept или параметру format.
     """
     permission_classes = [permissions.IsAuthenticated]
+    renderer_classes = SHOPPING_CART_EXPORTERS
+
+    def handle_exception(self, exc):
+        """
+        Метод вывода ошибок в формате JSON вне зависимости
+        от выбранного формата выгрузки.
+        """
+        response = super().handle_exception(exc)
+        self.request.accepted_renderer = JSONRenderer()
+        self.request.accepted_media_type = JSONRenderer.media_type
+        return response
 
     def download(self, request):
         """
         Метод создания списка покупок.
+        Строки списка читаются из списка покупок пользователя.
         """
-        result = IngredientRecipe.objects.filter(
-            recipe__carts__user=request.user).values(
-            'ingredient__name', 'ingredient__measurement_unit').order_by(
-                'ingredient__name').annotate(ingredient_total=Sum('amount'))
-        return canvas_method(result)
+        return request.accepted_renderer.response(
+            shopping_list_rows(request.user), request.user)
+
+
+class ShoppingListViewSet(viewsets.ReadOnlyModelViewSet):
+    """
+    Вьюсет списка покупок пользователя.
+    """
+    serializer_class = ShoppingListItemSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    pagination_class = None
+
+    def get_queryset(self):
+        return shopping_list_rows(self.request.user)
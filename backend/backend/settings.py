@@ -58,6 +58,14 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'backend.wsgi.application'
 
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', 'foodgram'),
+    }
+}
+
 CORS_ORIGIN_ALLOW_ALL = True
 CORS_URLS_REGEX = r'^/api/.*$'
 
@@ -120,10 +128,26 @@ REST_FRAMEWORK = {
         'rest_framework.authentication.TokenAuthentication',
     ],
     'DEFAULT_PAGINATION_CLASS': 'api.pagination.CustomPagination',
-    'DEFAULT_RENDERER_CLASSES': (
-        'rest_framework.renderers.JSONRenderer',
-        'rest_framework.renderers.BrowsableAPIRenderer',)
+    'DEFAULT_PARSER_CLASSES': [
+        'api.parsers.LimitedJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
+}
+
+RENDERER_PROFILES = {
+    'production': (
+        'api.renderers.FastJSONRenderer',
+    ),
+    'development': (
+        'api.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
 }
+RENDERER_PROFILE = os.getenv(
+    'RENDERER_PROFILE', 'development' if DEBUG else 'production')
+REST_FRAMEWORK['DEFAULT_RENDERER_CLASSES'] = RENDERER_PROFILES[
+    RENDERER_PROFILE]
 
 DJOSER = {
     'PERMISSIONS': {
@@ -145,3 +169,58 @@ MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
 PAGE_SIZE = 6
+
+PAGINATION_COUNT_CACHE_TIMEOUT = 30
+PAGINATION_ESTIMATE_THRESHOLD = 10000
+
+PDF_FONT_PATH = os.path.join(BASE_DIR, 'data', 'FreeSans.ttf')
+
+SHOPPING_CART_CACHE_TIMEOUT = 60 * 60
+
+# Единицы измерения списка покупок, переводимые в базовую:
+# единица: (базовая единица, множитель).
+SHOPPING_LIST_UNIT_CONVERSIONS = {
+    'кг': ('г', 1000),
+    'л': ('мл', 1000),
+}
+
+REFERENCE_CACHE_TIMEOUT = 24 * 60 * 60
+# Время хранения версий справочников в памяти процесса, секунды.
+REFERENCE_VERSION_TTL = 5
+
+INGREDIENT_AUTOCOMPLETE_INDEX = True
+INGREDIENT_AUTOCOMPLETE_INDEX_TTL = 5 * 60
+INGREDIENT_AUTOCOMPLETE_LIMIT = 50
+
+RECIPE_SEARCH_INDEX_TTL = 5 * 60
+
+RECIPE_COVERAGE_MAX_INGREDIENTS = 100
+
+RECIPE_LIST_FAST_PATH = True
+
+BULK_RECIPES_MAX = 100
+
+RECIPE_IMAGE_PROCESSING = True
+RECIPE_IMAGE_ASYNC = True
+RECIPE_IMAGE_WORKERS = 2
+RECIPE_IMAGE_FORMAT = 'WEBP'
+RECIPE_IMAGE_QUALITY = 85
+RECIPE_IMAGE_MAX_SIZE = 1600
+RECIPE_THUMBNAIL_SIZES = (
+    ('small', 320),
+    ('medium', 640),
+)
+RECIPE_IMAGE_UPLOAD_MAX_BYTES = int(
+    os.getenv('RECIPE_IMAGE_UPLOAD_MAX_BYTES', 10 * 1024 * 1024))
+RECIPE_IMAGE_UPLOAD_MAX_PIXELS = int(
+    os.getenv('RECIPE_IMAGE_UPLOAD_MAX_PIXELS', 40 * 1000 * 1000))
+RECIPE_IMAGE_DECODE_CHUNK_SIZE = 64 * 1024
+
+# Тело запроса JSON вмещает изображение в base64 и остальные поля рецепта.
+API_JSON_MAX_BODY_SIZE = RECIPE_IMAGE_UPLOAD_MAX_BYTES * 4 // 3 + 1024 * 1024
+
+POPULARITY_HALF_LIFE_DAYS = 7
+POPULARITY_FAVORITE_WEIGHT = 1.0
+POPULARITY_CART_WEIGHT = 2.0
+
+FEED_INBOX = os.getenv('FEED_INBOX', 'False') == 'True'
@@ -2,10 +2,12 @@
 Настройка админ зоны проекта Foodgram.
 """
 
+from api.search import update_search_index
 from django.contrib import admin
 
 from .models import (Cart, Favorite, Ingredient, IngredientRecipe, Recipe,
                      Subscribe, Tag, TagRecipe)
+from .shopping_list import rebuild_shopping_lists
 
 
 class MinValidatedInlineMixIn:
@@ -70,6 +72,24 @@ class CartAdmin(admin.ModelAdmin):
     empty_value_display = '-пусто-'
     list_filter = ('user',)
 
+    def save_model(self, request, obj, form, change):
+        """
+        Метод сохранения корзины с перестроением списков покупок.
+        """
+        user_ids = set(Cart.objects.filter(id=obj.id).values_list(
+            'user_id', flat=True))
+        super().save_model(request, obj, form, change)
+        rebuild_shopping_lists(user_ids | {obj.user_id})
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        rebuild_shopping_lists([obj.user_id])
+
+    def delete_queryset(self, request, queryset):
+        user_ids = set(queryset.values_list('user_id', flat=True))
+        super().delete_queryset(request, queryset)
+        rebuild_shopping_lists(user_ids)
+
 
 @admin.register(Favorite)
 class FavoriteAdmin(admin.ModelAdmin):
@@ -90,17 +110,39 @@ class RecipeAdmin(admin.ModelAdmin):
 
     inlines = [IngredientRecipeInline, TagRecipeInline]
     list_display = ('name', 'author', 'cooking_time',
-                    'id', 'count_favorite', 'pub_date')
+                    'id', 'count_favorite', 'carts_count', 'pub_date')
     search_fields = ('name', 'author', 'tags')
     empty_value_display = '-пусто-'
     list_filter = ('name', 'author', 'tags')
 
+    def save_related(self, request, form, formsets, change):
+        """
+        Метод сохранения продуктов рецепта
+        с перестроением списков покупок и поискового вектора.
+        """
+        super().save_related(request, form, formsets, change)
+        update_search_index([form.instance.id])
+        rebuild_shopping_lists(set(Cart.objects.filter(
+            recipe=form.instance).values_list('user_id', flat=True)))
+
+    def delete_model(self, request, obj):
+        user_ids = set(Cart.objects.filter(recipe=obj).values_list(
+            'user_id', flat=True))
+        super().delete_model(request, obj)
+        rebuild_shopping_lists(user_ids)
+
+    def delete_queryset(self, request, queryset):
+        user_ids = set(Cart.objects.filter(recipe__in=queryset).values_list(
+            'user_id', flat=True))
+        super().delete_queryset(request, queryset)
+        rebuild_shopping_lists(user_ids)
+
     def count_favorite(self, obj):
         """
-        Метод для подсчета общего числа
+        Метод получения общего числа
         добавлений этого рецепта в избранное.
         """
-        return Favorite.objects.filter(recipe=obj).count()
+        return obj.favorites_count
     count_favorite.short_description = 'Число добавлении в избранное'
 
 
@@ -0,0 +1,64 @@
+"""
+Пересчет счетчиков рецептов и пользователей.
+"""
+from django.db.models import Count, F, IntegerField, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce, Greatest
+
+
+def count_subquery(model, field):
+    """
+    Подзапрос числа строк model, ссылающихся на объект через field.
+    """
+    return Coalesce(
+        Subquery(
+            model.objects.filter(**{field: OuterRef('pk')})
+            .order_by().values(field).annotate(total=Count('pk'))
+            .values('total'),
+            output_field=IntegerField(),
+        ),
+        0,
+    )
+
+
+def change_counter(queryset, field, delta):
+    """
+    Метод изменения счетчика field объектов queryset на delta.
+    Значение счетчика не опускается ниже нуля.
+    """
+    return queryset.update(**{field: Greatest(F(field) + delta, 0)})
+
+
+def get_counters(recipe_model, user_model, favorite_model, cart_model,
+                 subscribe_model):
+    """
+    Описание счетчиков: модель, поле счетчика и выражение
+    для вычисления его точного значения.
+    """
+    return (
+        (recipe_model, 'favorites_count',
+         count_subquery(favorite_model, 'recipe')),
+        (recipe_model, 'carts_count', count_subquery(cart_model, 'recipe')),
+        (user_model, 'recipes_count', count_subquery(recipe_model, 'author')),
+        (user_model, 'followers_count',
+         count_subquery(subscribe_model, 'following')),
+    )
+
+
+def find_drift(counters):
+    """
+    Метод подсчета объектов с расхождением счетчика.
+    """
+    return {
+        (model.__name__, field): model.objects.annotate(
+            actual_count=expression).filter(
+            ~Q(**{field: F('actual_count')})).count()
+        for model, field, expression in counters
+    }
+
+
+def recount(counters):
+    """
+    Метод пересчета счетчиков одним запросом UPDATE на счетчик.
+    """
+    for model, field, expression in counters:
+        model.objects.update(**{field: expression})
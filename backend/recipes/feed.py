@@ -0,0 +1,66 @@
+"""
+Поддержка ленты рецептов подписок пользователя.
+Лента заполняется при публикации рецепта и при подписке,
+если включена настройка FEED_INBOX.
+"""
+from django.conf import settings
+from django.db import transaction
+
+from .models import FeedEntry, Recipe, Subscribe
+
+BATCH_SIZE = 1000
+
+
+def fan_out_recipe(recipe):
+    """
+    Добавление рецепта в ленты подписчиков автора.
+    """
+    if not settings.FEED_INBOX:
+        return
+    FeedEntry.objects.bulk_create((
+        FeedEntry(user_id=user_id, recipe_id=recipe.id,
+                  pub_date=recipe.pub_date)
+        for user_id in Subscribe.objects.filter(
+            following_id=recipe.author_id).values_list('user_id', flat=True)
+    ), batch_size=BATCH_SIZE, ignore_conflicts=True)
+
+
+def add_author_recipes(user_id, author_id):
+    """
+    Добавление рецептов автора в ленту нового подписчика.
+    """
+    if not settings.FEED_INBOX:
+        return
+    FeedEntry.objects.bulk_create((
+        FeedEntry(user_id=user_id, recipe_id=recipe_id, pub_date=pub_date)
+        for recipe_id, pub_date in Recipe.objects.filter(
+            author_id=author_id).values_list('id', 'pub_date')
+    ), batch_size=BATCH_SIZE, ignore_conflicts=True)
+
+
+def remove_author_recipes(user_id, author_id):
+    """
+    Удаление рецептов автора из ленты бывшего подписчика.
+    """
+    if not settings.FEED_INBOX:
+        return
+    FeedEntry.objects.filter(
+        user_id=user_id, recipe__author_id=author_id).delete()
+
+
+@transaction.atomic
+def rebuild_feed():
+    """
+    Полное перестроение лент всех пользователей по подпискам.
+    Возвращает число записей лент.
+    """
+    FeedEntry.objects.all().delete()
+    entries = Subscribe.objects.filter(
+        following__recipes__isnull=False,
+    ).values_list(
+        'user_id', 'following__recipes__id', 'following__recipes__pub_date')
+    FeedEntry.objects.bulk_create((
+        FeedEntry(user_id=user_id, recipe_id=recipe_id, pub_date=pub_date)
+        for user_id, recipe_id, pub_date in entries.iterator()
+    ), batch_size=BATCH_SIZE)
+    return FeedEntry.objects.count()
@@ -0,0 +1,179 @@
+"""
+Фоновая обработка изображений рецептов.
+После сохранения рецепта изображение уменьшается, перекодируется
+в WebP (или JPEG, если Pillow собран без WebP) и для него создаются
+миниатюры. Обработка выполняется в пуле потоков процесса.
+"""
+import io
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import connection, transaction
+from PIL import Image, ImageOps, features
+
+from .models import Recipe
+
+logger = logging.getLogger(__name__)
+
+SAVE_OPTIONS = {
+    'WEBP': {'method': 4},
+    'JPEG': {'optimize': True, 'progressive': True},
+}
+
+executor = None
+executor_lock = threading.Lock()
+
+
+def get_storage():
+    return Recipe._meta.get_field('image').storage
+
+
+def get_format():
+    """
+    Метод выбора формата и расширения файлов изображений.
+    """
+    if settings.RECIPE_IMAGE_FORMAT == 'WEBP' and features.check('webp'):
+        return 'WEBP', 'webp'
+    return 'JPEG', 'jpg'
+
+
+def prepare(image, image_format):
+    """
+    Приведение режима изображения к поддерживаемому форматом.
+    Для JPEG прозрачность заменяется белым фоном.
+    """
+    if 'A' not in image.getbands() and 'transparency' not in image.info:
+        return image.convert('RGB')
+    image = image.convert('RGBA')
+    if image_format != 'JPEG':
+        return image
+    background = Image.new('RGB', image.size, 'white')
+    background.paste(image, mask=image)
+    return background
+
+
+def save_resized(image, size, name, image_format):
+    """
+    Сохранение копии изображения, вписанной в квадрат size.
+    Изображение не увеличивается. Возвращает имя файла в хранилище.
+    """
+    resized = image.copy()
+    resized.thumbnail((size, size), Image.LANCZOS)
+    buffer = io.BytesIO()
+    resized.save(buffer, image_format,
+                 quality=settings.RECIPE_IMAGE_QUALITY,
+                 **SAVE_OPTIONS[image_format])
+    return get_storage().save(name, ContentFile(buffer.getvalue()))
+
+
+def process_recipe_image(recipe_id):
+    """
+    Уменьшение и перекодирование изображения рецепта
+    и создание миниатюр размеров RECIPE_THUMBNAIL_SIZES.
+    Если за время обработки изображение рецепта заменили,
+    результат обработки удаляется, иначе удаляются исходное
+    изображение и прежние миниатюры.
+    """
+    name, old_thumbnails = Recipe.objects.filter(id=recipe_id).values_list(
+        'image', 'thumbnails').first() or (None, None)
+    if not name:
+        return
+    storage = get_storage()
+    with storage.open(name) as source:
+        image = ImageOps.exif_transpose(Image.open(source))
+        image.load()
+    image_format, extension = get_format()
+    image = prepare(image, image_format)
+    stem = os.path.splitext(os.path.basename(name))[0]
+    processed = save_resized(
+        image, settings.RECIPE_IMAGE_MAX_SIZE,
+        f'recipes/{stem}.{extension}', image_format)
+    thumbnails = {
+        size_name: save_resized(
+            image, size, f'recipes/thumbnails/{stem}_{size_name}.{extension}',
+            image_format)
+        for size_name, size in settings.RECIPE_THUMBNAIL_SIZES
+    }
+    updated = Recipe.objects.filter(id=recipe_id, image=name).update(
+        image=processed, thumbnails=thumbnails)
+    if not updated:
+        for created in (processed, *thumbnails.values()):
+            storage.delete(created)
+        return
+    delete_replaced_files(name, old_thumbnails)
+
+
+def delete_replaced_files(name, thumbnails):
+    """
+    Удаление файлов замененного изображения рецепта: миниатюр
+    и самого изображения, если на него не ссылаются другие рецепты.
+    """
+    storage = get_storage()
+    for thumbnail in (thumbnails or {}).values():
+        storage.delete(thumbnail)
+    if name and not Recipe.objects.filter(image=name).exists():
+        storage.delete(name)
+
+
+def schedule_replaced_files_deletion(name, thumbnails):
+    """
+    Удаление файлов замененного изображения рецепта
+    после фиксации транзакции.
+    """
+    transaction.on_commit(lambda: delete_replaced_files(name, thumbnails))
+
+
+def run_in_worker(recipe_id):
+    """
+    Обработка изображения в потоке пула.
+    Соединение с базой потока закрывается после обработки.
+    """
+    try:
+        process_recipe_image(recipe_id)
+    except Exception:
+        logger.exception(
+            'Не удалось обработать изображение рецепта %s', recipe_id)
+    finally:
+        connection.close()
+
+
+def get_executor():
+    global executor
+    with executor_lock:
+        if executor is None:
+            executor = ThreadPoolExecutor(
+                max_workers=settings.RECIPE_IMAGE_WORKERS,
+                thread_name_prefix='recipe-images',
+            )
+    return executor
+
+
+def schedule_image_processing(recipe_id):
+    """
+    Постановка изображения рецепта в очередь обработки
+    после фиксации транзакции.
+    """
+    if not settings.RECIPE_IMAGE_PROCESSING:
+        return
+    if settings.RECIPE_IMAGE_ASYNC:
+        transaction.on_commit(
+            lambda: get_executor().submit(run_in_worker, recipe_id))
+    else:
+        transaction.on_commit(lambda: process_recipe_image(recipe_id))
+
+
+def thumbnail_urls(thumbnails, request=None):
+    """
+    Метод получения ссылок на миниатюры изображения рецепта.
+    """
+    storage = get_storage()
+    urls = {}
+    for size_name, name in (thumbnails or {}).items():
+        url = storage.url(name)
+        urls[size_name] = (
+            request.build_absolute_uri(url) if request is not None else url)
+    return urls
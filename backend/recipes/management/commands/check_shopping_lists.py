@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+from recipes.shopping_list import find_drift, rebuild_shopping_lists
+
+
+class Command(BaseCommand):
+    help = 'проверка списков покупок пользователей по их корзинам'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--fix', action='store_true',
+            help='перестроить списки покупок с расхождениями')
+
+    def handle(self, *args, **options):
+        user_ids = find_drift()
+        if not user_ids:
+            self.stdout.write(self.style.SUCCESS('Расхождений нет'))
+            return
+        self.stdout.write(
+            f'Списков покупок с расхождениями: {len(user_ids)}, '
+            f'пользователи: {", ".join(map(str, user_ids[:20]))}')
+        if not options['fix']:
+            return
+        rebuild_shopping_lists(user_ids)
+        self.stdout.write(self.style.SUCCESS('Списки покупок перестроены'))
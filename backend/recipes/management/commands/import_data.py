@@ -1,46 +1,179 @@
 import csv
+import json
+import os
+from itertools import islice
 
-from django.core.management.base import BaseCommand
+from api.cache import bump_version
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError, transaction
 from recipes.models import Ingredient, Tag
 
+MAX_REJECTED_REPORT = 50
+
+SOURCES = (
+    {
+        'title': 'Ingredients',
+        'cache_name': 'ingredients',
+        'model': Ingredient,
+        'fields': ('name', 'measurement_unit'),
+        'key': ('name', 'measurement_unit'),
+        'paths': ('./data/ingredients.csv', './data/ingredients.json'),
+    },
+    {
+        'title': 'Tags',
+        'cache_name': 'tags',
+        'model': Tag,
+        'fields': ('name', 'color', 'slug'),
+        'key': ('slug',),
+        'paths': ('./data/tags.csv',),
+    },
+)
+
+
+def read_csv(path, fieldnames):
+    """
+    Построчное чтение CSV файла.
+    Строка заголовка пропускается, если она есть в файле.
+    """
+    with open(path, 'r', newline='', encoding='utf-8') as data:
+        for number, row in enumerate(csv.reader(data), start=1):
+            if number == 1 and tuple(row) == fieldnames:
+                continue
+            if len(row) != len(fieldnames):
+                yield number, None
+                continue
+            yield number, dict(zip(fieldnames, row))
+
+
+def read_json(path, fieldnames):
+    """
+    Чтение JSON файла со списком объектов.
+    """
+    with open(path, 'r', encoding='utf-8') as data:
+        for number, row in enumerate(json.load(data), start=1):
+            if not isinstance(row, dict):
+                yield number, None
+                continue
+            yield number, {field: row.get(field) for field in fieldnames}
+
+
+READERS = {
+    '.csv': read_csv,
+    '.json': read_json,
+}
+
 
 class Command(BaseCommand):
     help = 'импорт фикстур из директории: data'
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--ingredients', nargs='+', metavar='PATH',
+            help='CSV или JSON файлы продуктов')
+        parser.add_argument(
+            '--tags', nargs='+', metavar='PATH',
+            help='CSV или JSON файлы тегов')
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='количество объектов в одном запросе INSERT')
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='показать изменения без записи в базу')
+
     def handle(self, *args, **options):
-        # import Ingredient model
-        path = './data/ingredients.csv'
-        with open(path, 'r', newline='', encoding='utf-8') as data:
-            result = csv.DictReader(data, delimiter=',')
-            for line in result:
-                try:
-                    name = line['name']
-                    measurement_unit = line['measurement_unit']
-                    Ingredient.objects.get_or_create(
-                        name=name,
-                        measurement_unit=measurement_unit
-                    )
-
-                except Exception as error_ingredient:
-                    print(
-                        f'упали на разборе строки продукта {name}:'
-                        f' {error_ingredient}'
-                    )
-            print('Все данные модели Ingredients загружены')
-        # import Tag model
-        path = './data/tags.csv'
-        with open(path, 'r', newline='', encoding='utf-8') as data:
-            result = csv.DictReader(data, delimiter=',')
-            for line in result:
+        paths = {
+            'Ingredients': options['ingredients'],
+            'Tags': options['tags'],
+        }
+        plans = [
+            self.collect(source, paths[source['title']] or source['paths'])
+            for source in SOURCES
+        ]
+        if options['dry_run']:
+            if options['verbosity'] > 1:
+                for source, objects in plans:
+                    for instance in objects:
+                        self.stdout.write('+ ' + ', '.join(
+                            getattr(instance, field)
+                            for field in source['fields']))
+            self.stdout.write('Пробный запуск, данные не записаны')
+            return
+        try:
+            with transaction.atomic():
+                for source, objects in plans:
+                    self.save(source, objects, options['batch_size'])
+        except DatabaseError as error:
+            raise CommandError(
+                f'Импорт отменен, изменения не сохранены: {error}')
+
+    def collect(self, source, paths):
+        """
+        Чтение, проверка и сравнение строк файлов с данными в базе.
+        Возвращает новые объекты модели.
+        """
+        model, key = source['model'], source['key']
+        existing = set(model.objects.values_list(*key))
+        seen, objects, rejected, total = set(), [], [], 0
+        for path in paths:
+            reader = READERS.get(os.path.splitext(path)[1].lower())
+            if reader is None:
+                raise CommandError(f'Неизвестный формат файла: {path}')
+            if not os.path.exists(path):
+                raise CommandError(f'Файл не найден: {path}')
+            for number, row in reader(path, source['fields']):
+                total += 1
+                if row is None:
+                    rejected.append((path, number, 'неверный формат строки'))
+                    continue
+                row = {
+                    field: str(value or '').strip()
+                    for field, value in row.items()
+                }
+                instance = model(**row)
                 try:
-                    name = line['name']
-                    color = line['color']
-                    slug = line['slug']
-                    Tag.objects.get_or_create(
-                        name=name,
-                        color=color,
-                        slug=slug,
-                    )
-                except Exception as error_tag:
-                    print(f'упали на разборе строки тега {name}: {error_tag}')
-            print('Все данные модели Tags загружены')
+                    instance.clean_fields()
+                except ValidationError as error:
+                    rejected.append((path, number, error.message_dict))
+                    continue
+                row_key = tuple(row[field] for field in key)
+                if row_key in seen or row_key in existing:
+                    continue
+                seen.add(row_key)
+                objects.append(instance)
+        self.report(source['title'], total, len(objects), rejected)
+        return source, objects
+
+    def save(self, source, objects, batch_size):
+        """
+        Пакетная запись новых объектов модели.
+        """
+        model, saved = source['model'], 0
+        iterator = iter(objects)
+        batch = list(islice(iterator, batch_size))
+        while batch:
+            model.objects.bulk_create(batch, ignore_conflicts=True)
+            saved += len(batch)
+            self.stdout.write(
+                f'{source["title"]}: записано {saved} из {len(objects)}')
+            batch = list(islice(iterator, batch_size))
+        if saved:
+            transaction.on_commit(
+                lambda: bump_version(source['cache_name']))
+        self.stdout.write(self.style.SUCCESS(
+            f'Все данные модели {source["title"]} загружены'))
+
+    def report(self, title, total, new, rejected):
+        """
+        Вывод сводки по прочитанным строкам.
+        """
+        self.stdout.write(
+            f'{title}: прочитано {total}, новых {new}, '
+            f'повторов и уже в базе {total - new - len(rejected)}, '
+            f'отклонено {len(rejected)}'
+        )
+        for path, number, reason in rejected[:MAX_REJECTED_REPORT]:
+            self.stderr.write(f'  {path}:{number}: {reason}')
+        if len(rejected) > MAX_REJECTED_REPORT:
+            self.stderr.write(
+                f'  ... еще {len(rejected) - MAX_REJECTED_REPORT}')
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+from recipes.images import process_recipe_image
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = 'обработка изображений рецептов и создание миниатюр'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all', action='store_true',
+            help='обработать и рецепты, у которых уже есть миниатюры')
+
+    def handle(self, *args, **options):
+        processed = 0
+        for recipe_id, thumbnails in Recipe.objects.values_list(
+                'id', 'thumbnails').iterator():
+            if thumbnails and not options['all']:
+                continue
+            process_recipe_image(recipe_id)
+            processed += 1
+        self.stdout.write(self.style.SUCCESS(
+            f'Обработано изображений: {processed}'))
@@ -0,0 +1,14 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from recipes.feed import rebuild_feed
+
+
+class Command(BaseCommand):
+    help = 'перестроение лент рецептов подписок пользователей'
+
+    def handle(self, *args, **options):
+        if not settings.FEED_INBOX:
+            raise CommandError('Ленты отключены, включите FEED_INBOX')
+        entries = rebuild_feed()
+        self.stdout.write(self.style.SUCCESS(
+            f'Ленты перестроены, записей: {entries}'))
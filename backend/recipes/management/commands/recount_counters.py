@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from recipes.counters import find_drift, get_counters, recount
+from recipes.models import Cart, Favorite, Recipe, Subscribe
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = 'проверка и пересчет счетчиков рецептов и пользователей'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check', action='store_true',
+            help='только показать расхождения без исправления')
+
+    def handle(self, *args, **options):
+        counters = get_counters(Recipe, User, Favorite, Cart, Subscribe)
+        for (model, field), drift in find_drift(counters).items():
+            self.stdout.write(f'{model}.{field}: расхождений {drift}')
+        if options['check']:
+            return
+        with transaction.atomic():
+            recount(counters)
+        self.stdout.write(self.style.SUCCESS('Счетчики пересчитаны'))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from recipes.popularity import refresh_popularity
+
+
+class Command(BaseCommand):
+    help = 'обновление рейтинга популярности рецептов'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--full', action='store_true',
+            help='пересчитать рейтинг всех рецептов')
+
+    def handle(self, *args, **options):
+        refreshed = refresh_popularity(full=options['full'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Рейтинг обновлен, рецептов: {refreshed}'))
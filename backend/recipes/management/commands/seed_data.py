@@ -0,0 +1,168 @@
+import io
+import random
+import string
+
+from api.search import update_search_index
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils.crypto import get_random_string
+from PIL import Image
+from recipes.counters import get_counters, recount
+from recipes.feed import rebuild_feed
+from recipes.models import (Cart, Favorite, Ingredient, IngredientRecipe,
+                            Recipe, Subscribe, Tag, TagRecipe)
+from recipes.popularity import refresh_popularity
+from recipes.shopping_list import rebuild_shopping_lists
+from users.models import User
+
+SEED_PASSWORD = 'seed-password'
+SEED_IMAGE = 'recipes/seed.png'
+MIN_INGREDIENTS = 200
+UNITS = ('г', 'кг', 'мл', 'шт.', 'ст. л.')
+TAGS = (
+    ('Завтрак', '#ffed00', 'breakfast'),
+    ('Обед', '#52bf90', 'dinner'),
+    ('Ужин', '#9d00ff', 'lunch'),
+)
+
+
+class Command(BaseCommand):
+    help = 'заполнение базы синтетическими данными для замеров'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=50)
+        parser.add_argument('--recipes', type=int, default=500)
+        parser.add_argument('--ingredients-per-recipe', type=int, default=8)
+        parser.add_argument(
+            '--subscriptions', type=int, default=10,
+            help='количество подписок каждого пользователя')
+        parser.add_argument(
+            '--carts', type=int, default=5,
+            help='количество рецептов в корзине каждого пользователя')
+        parser.add_argument(
+            '--favorites', type=int, default=10,
+            help='количество избранных рецептов каждого пользователя')
+        parser.add_argument('--seed', type=int, default=0)
+
+    @transaction.atomic
+    def handle(self, *args, **options):
+        random.seed(options['seed'])
+        run = get_random_string(6).lower()
+        ingredient_ids = self.seed_ingredients(
+            options['ingredients_per_recipe'])
+        tag_ids = self.seed_tags()
+        user_ids = self.seed_users(run, options['users'])
+        recipe_ids = self.seed_recipes(run, user_ids, options['recipes'])
+
+        IngredientRecipe.objects.bulk_create((
+            IngredientRecipe(
+                recipe_id=recipe_id,
+                ingredient_id=ingredient_id,
+                amount=random.randint(1, 500),
+            )
+            for recipe_id in recipe_ids
+            for ingredient_id in random.sample(
+                ingredient_ids, options['ingredients_per_recipe'])
+        ), batch_size=1000)
+        TagRecipe.objects.bulk_create((
+            TagRecipe(recipe_id=recipe_id, tag_id=tag_id)
+            for recipe_id in recipe_ids
+            for tag_id in random.sample(
+                tag_ids, random.randint(1, len(tag_ids)))
+        ), batch_size=1000)
+        Subscribe.objects.bulk_create((
+            Subscribe(user_id=user_id, following_id=following_id)
+            for user_id in user_ids
+            for following_id in random.sample(
+                [other for other in user_ids if other != user_id],
+                min(options['subscriptions'], len(user_ids) - 1))
+        ), batch_size=1000)
+        for model, count in ((Cart, options['carts']),
+                             (Favorite, options['favorites'])):
+            model.objects.bulk_create((
+                model(user_id=user_id, recipe_id=recipe_id)
+                for user_id in user_ids
+                for recipe_id in random.sample(
+                    recipe_ids, min(count, len(recipe_ids)))
+            ), batch_size=1000)
+        recount(get_counters(Recipe, User, Favorite, Cart, Subscribe))
+        refresh_popularity(full=True)
+        rebuild_shopping_lists()
+        update_search_index()
+        if settings.FEED_INBOX:
+            rebuild_feed()
+        self.stdout.write(self.style.SUCCESS(
+            f'Создано пользователей: {len(user_ids)}, '
+            f'рецептов: {len(recipe_ids)}. '
+            f'Пароль пользователей: {SEED_PASSWORD}'
+        ))
+
+    def seed_ingredients(self, per_recipe):
+        """
+        Создание недостающих продуктов.
+        """
+        missing = max(MIN_INGREDIENTS, per_recipe) - Ingredient.objects.count()
+        if missing > 0:
+            Ingredient.objects.bulk_create((
+                Ingredient(
+                    name='продукт ' + ''.join(
+                        random.choices(string.ascii_lowercase, k=8)),
+                    measurement_unit=random.choice(UNITS),
+                )
+                for _ in range(missing)
+            ), ignore_conflicts=True)
+        return list(Ingredient.objects.values_list('id', flat=True))
+
+    def seed_tags(self):
+        """
+        Создание тегов, если их нет в базе.
+        """
+        if not Tag.objects.exists():
+            Tag.objects.bulk_create(
+                Tag(name=name, color=color, slug=slug)
+                for name, color, slug in TAGS
+            )
+        return list(Tag.objects.values_list('id', flat=True))
+
+    def seed_users(self, run, count):
+        """
+        Создание пользователей с общим паролем.
+        """
+        password = make_password(SEED_PASSWORD)
+        User.objects.bulk_create(
+            User(
+                username=f'seed_{run}_{number}',
+                email=f'seed_{run}_{number}@foodgram.local',
+                first_name='Имя',
+                last_name='Фамилия',
+                password=password,
+            )
+            for number in range(count)
+        )
+        return list(User.objects.filter(
+            username__startswith=f'seed_{run}_').values_list('id', flat=True))
+
+    def seed_recipes(self, run, user_ids, count):
+        """
+        Создание рецептов с общим изображением.
+        """
+        if not default_storage.exists(SEED_IMAGE):
+            buffer = io.BytesIO()
+            Image.new('RGB', (64, 64), '#52bf90').save(buffer, 'PNG')
+            default_storage.save(SEED_IMAGE, ContentFile(buffer.getvalue()))
+        Recipe.objects.bulk_create((
+            Recipe(
+                author_id=random.choice(user_ids),
+                name=f'Рецепт {run} {number}',
+                image=SEED_IMAGE,
+                text='Описание рецепта ' * random.randint(1, 20),
+                cooking_time=random.randint(1, 120),
+            )
+            for number in range(count)
+        ), batch_size=1000)
+        return list(Recipe.objects.filter(
+            name__startswith=f'Рецепт {run} ').values_list('id', flat=True))
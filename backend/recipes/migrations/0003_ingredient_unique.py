@@ -0,0 +1,58 @@
+# Generated by Django 3.2.6 on 2026-10-18 05:25
+
+from django.db import migrations, models
+
+
+def merge_duplicate_ingredients(apps, schema_editor):
+    """
+    Объединение одинаковых продуктов в продукт с наименьшим id.
+    Строки рецептов переносятся на него, количества одного
+    продукта в рецепте складываются.
+    """
+    Ingredient = apps.get_model('recipes', 'Ingredient')
+    IngredientRecipe = apps.get_model('recipes', 'IngredientRecipe')
+    duplicates = Ingredient.objects.values(
+        'name', 'measurement_unit',
+    ).annotate(
+        keep_id=models.Min('id'), total=models.Count('id'),
+    ).filter(total__gt=1).order_by()
+    for duplicate in duplicates:
+        keep_id = duplicate['keep_id']
+        extra_ids = list(Ingredient.objects.filter(
+            name=duplicate['name'],
+            measurement_unit=duplicate['measurement_unit'],
+        ).exclude(id=keep_id).values_list('id', flat=True))
+        rows = IngredientRecipe.objects.filter(
+            ingredient_id__in=extra_ids).order_by('id')
+        for row in rows:
+            kept = IngredientRecipe.objects.filter(
+                recipe_id=row.recipe_id, ingredient_id=keep_id).first()
+            if kept is None:
+                row.ingredient_id = keep_id
+                row.save(update_fields=['ingredient'])
+                continue
+            kept.amount += row.amount
+            kept.save(update_fields=['amount'])
+            row.delete()
+        Ingredient.objects.filter(id__in=extra_ids).delete()
+
+
+class Migration(migrations.Migration):
+    # Слияние выполняется в собственной транзакции: PostgreSQL не даёт
+    # менять таблицу с отложенными проверками внешних ключей.
+    atomic = False
+
+    dependencies = [
+        ('recipes', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            merge_duplicate_ingredients, migrations.RunPython.noop,
+            atomic=True,
+        ),
+        migrations.AddConstraint(
+            model_name='ingredient',
+            constraint=models.UniqueConstraint(fields=('name', 'measurement_unit'), name='unique_ingredient'),
+        ),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 3.2.6 on 2026-10-18 05:39
+
+import django.contrib.postgres.search
+from django.db import migrations
+
+FILL_SEARCH_VECTOR = '''
+    UPDATE recipes_recipe SET search_vector =
+        setweight(to_tsvector('russian', name), 'A')
+        || setweight(to_tsvector('russian', COALESCE((
+            SELECT string_agg(ingredient.name, ' ')
+            FROM recipes_ingredientrecipe AS ingredientrecipe
+            JOIN recipes_ingredient AS ingredient
+                ON ingredient.id = ingredientrecipe.ingredient_id
+            WHERE ingredientrecipe.recipe_id = recipes_recipe.id
+        ), '')), 'B')
+        || setweight(to_tsvector('russian', text), 'C')
+'''
+
+
+def create_search_index(apps, schema_editor):
+    """
+    Заполнение поискового вектора и GIN индекс по нему.
+    Выполняется только в PostgreSQL.
+    """
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(FILL_SEARCH_VECTOR)
+    schema_editor.execute(
+        'CREATE INDEX IF NOT EXISTS recipes_recipe_search_vector '
+        'ON recipes_recipe USING gin (search_vector)')
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('DROP INDEX IF EXISTS recipes_recipe_search_vector')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0008_feed'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True, verbose_name='Поисковый вектор'),
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
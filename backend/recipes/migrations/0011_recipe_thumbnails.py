@@ -0,0 +1,18 @@
+# Generated by Django 3.2.6 on 2026-10-18 05:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0010_tagrecipe_recipe_tag_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='thumbnails',
+            field=models.JSONField(default=dict, editable=False, verbose_name='Миниатюры изображения'),
+        ),
+    ]
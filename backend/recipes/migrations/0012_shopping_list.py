@@ -0,0 +1,56 @@
+# Generated by Django 3.2.6 on 2026-10-18 05:51
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import Sum
+
+
+def fill_shopping_lists(apps, schema_editor):
+    """
+    Заполнение списков покупок по корзинам пользователей.
+    """
+    Cart = apps.get_model('recipes', 'Cart')
+    ShoppingListItem = apps.get_model('recipes', 'ShoppingListItem')
+    rows = Cart.objects.filter(
+        recipe__ingredientrecipes__isnull=False,
+    ).values(
+        'user_id', 'recipe__ingredientrecipes__ingredient_id',
+    ).annotate(total=Sum('recipe__ingredientrecipes__amount')).order_by()
+    ShoppingListItem.objects.bulk_create((
+        ShoppingListItem(
+            user_id=row['user_id'],
+            ingredient_id=row['recipe__ingredientrecipes__ingredient_id'],
+            total=row['total'],
+        )
+        for row in rows.iterator()
+    ), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('recipes', '0011_recipe_thumbnails'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ShoppingListItem',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total', models.IntegerField(default=0, verbose_name='Количество продукта')),
+                ('ingredient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shopping_list_items', to='recipes.ingredient', verbose_name='Продукт')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shopping_list', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Строка списка покупок',
+                'verbose_name_plural': 'Строки списка покупок',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='shoppinglistitem',
+            constraint=models.UniqueConstraint(fields=('user', 'ingredient'), name='unique_shopping_list_item'),
+        ),
+        migrations.RunPython(fill_shopping_lists, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 3.2.6 on 2026-10-18 06:11
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def fill_reference_time(apps, schema_editor):
+    apps.get_model('recipes', 'RecipePopularity').objects.update(
+        reference_time=models.F('updated'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0013_reference_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipepopularity',
+            name='reference_time',
+            field=models.DateTimeField(default=django.utils.timezone.now, verbose_name='Время отсчета затухания'),
+            preserve_default=False,
+        ),
+        migrations.RunPython(fill_reference_time, migrations.RunPython.noop),
+    ]
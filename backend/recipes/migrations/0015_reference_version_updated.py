@@ -0,0 +1,38 @@
+# Generated by Django 3.2.6 on 2026-10-18 06:28
+
+from datetime import datetime, timezone
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+def copy_version_time(apps, schema_editor):
+    """
+    Перенос времени изменения из прежних версий-меток времени.
+    """
+    ReferenceVersion = apps.get_model('recipes', 'ReferenceVersion')
+    for reference in ReferenceVersion.objects.all():
+        reference.updated = datetime.fromtimestamp(
+            reference.version, tz=timezone.utc)
+        reference.save(update_fields=['updated'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0014_popularity_reference_time'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='referenceversion',
+            name='updated',
+            field=models.DateTimeField(default=django.utils.timezone.now, verbose_name='Время изменения'),
+        ),
+        migrations.AlterField(
+            model_name='referenceversion',
+            name='version',
+            field=models.BigIntegerField(default=1, verbose_name='Версия'),
+        ),
+        migrations.RunPython(copy_version_time, migrations.RunPython.noop),
+    ]
@@ -1,5 +1,12 @@
+from collections import defaultdict
+
+from django.contrib.postgres.search import SearchVectorField
 from django.core.validators import MinValueValidator
 from django.db import models
+from django.db.models import (BooleanField, Count, Exists, F, OuterRef,
+                              Prefetch, Q, Value, Window)
+from django.db.models.functions import RowNumber
+from django.utils import timezone
 from users.models import User
 
 from .fields import HexColorField
@@ -58,6 +65,10 @@ class Ingredient(models.Model):
         """
         verbose_name = 'Продукт'
         verbose_name_plural = 'Продукты'
+        constraints = [
+            models.UniqueConstraint(fields=['name', 'measurement_unit'],
+                                    name='unique_ingredient')
+        ]
 
     def __str__(self):
         """"
@@ -66,6 +77,108 @@ class Ingredient(models.Model):
         return self.name
 
 
+class RecipeQuerySet(models.QuerySet):
+    """
+    Набор запросов модели рецептов.
+    """
+
+    def with_user_flags(self, user):
+        """
+        Метод аннотации параметров is_favorited и is_in_shopping_cart
+        для пользователя одним запросом.
+        Поисковый вектор рецепта не загружается.
+        """
+        queryset = self.defer('search_vector')
+        if user.is_anonymous:
+            return queryset.annotate(
+                is_favorited=Value(False, output_field=BooleanField()),
+                is_in_shopping_cart=Value(False, output_field=BooleanField()),
+            )
+        return queryset.annotate(
+            is_favorited=Exists(Favorite.objects.filter(
+                user=user, recipe=OuterRef('pk'))),
+            is_in_shopping_cart=Exists(Cart.objects.filter(
+                user=user, recipe=OuterRef('pk'))),
+        )
+
+    def with_related(self, user):
+        """
+        План загрузки рецептов для чтения: автор с признаком подписки,
+        теги и продукты рецепта загружаются фиксированным числом
+        запросов вне зависимости от количества рецептов.
+        """
+        queryset = self.with_user_flags(user).prefetch_related(
+            Prefetch('tags', queryset=Tag.objects.order_by('id')),
+            Prefetch(
+                'ingredientrecipes',
+                queryset=IngredientRecipe.objects.select_related(
+                    'ingredient').order_by('id'),
+            ),
+        )
+        if user.is_anonymous:
+            return queryset.select_related('author')
+        return queryset.prefetch_related(Prefetch(
+            'author',
+            queryset=User.objects.annotate(is_subscribed=Exists(
+                Subscribe.objects.filter(
+                    user=user, following=OuterRef('pk')))),
+        ))
+
+    def feed(self, user):
+        """
+        Метод выборки рецептов авторов, на которых подписан пользователь,
+        полусоединением с подписками. При включенной настройке
+        FEED_INBOX лента выводится из записей FeedEntry.
+        """
+        return self.filter(Exists(Subscribe.objects.filter(
+            user=user, following=OuterRef('author_id'))))
+
+    def by_ingredients(self, ingredient_ids):
+        """
+        Метод подбора рецептов, в которых есть хотя бы один из продуктов,
+        одним запросом с группировкой по продуктам рецепта.
+        Рецепты с меньшим числом недостающих продуктов идут первыми.
+        """
+        in_list = Q(ingredientrecipes__ingredient_id__in=ingredient_ids)
+        return self.filter(id__in=IngredientRecipe.objects.filter(
+            ingredient_id__in=ingredient_ids).values('recipe_id'),
+        ).annotate(
+            ingredients_covered=Count(
+                'ingredientrecipes', filter=in_list, distinct=True),
+            ingredients_missing=Count(
+                'ingredientrecipes', filter=~in_list, distinct=True),
+        ).order_by('ingredients_missing', '-ingredients_covered',
+                   '-pub_date', '-id')
+
+    def previews(self, author_ids, limit=None):
+        """
+        Метод получения первых limit рецептов каждого из авторов
+        одним запросом с нумерацией рецептов внутри автора.
+        Возвращает словарь списков рецептов по id автора.
+        """
+        queryset = self.filter(author_id__in=author_ids).only(
+            'id', 'name', 'image', 'cooking_time', 'author_id')
+        if limit is None:
+            queryset = queryset.order_by('id')
+        else:
+            sql, params = queryset.order_by().annotate(
+                recipe_rank=Window(
+                    expression=RowNumber(),
+                    partition_by=[F('author_id')],
+                    order_by=F('id').asc(),
+                )
+            ).query.sql_with_params()
+            queryset = self.model.objects.raw(
+                f'SELECT * FROM ({sql}) ranked '
+                'WHERE ranked.recipe_rank <= %s ORDER BY ranked.id',
+                (*params, limit),
+            )
+        recipes = defaultdict(list)
+        for recipe in queryset:
+            recipes[recipe.author_id].append(recipe)
+        return recipes
+
+
 class Recipe(models.Model):
     """
     Создание модели рецептов.
@@ -113,6 +226,28 @@ class Recipe(models.Model):
         verbose_name='Продукты в рецепте',
         help_text='Выберите продукты рецепта'
     )
+    favorites_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Число добавлений в избранное'
+    )
+    carts_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Число добавлений в корзину'
+    )
+    thumbnails = models.JSONField(
+        default=dict,
+        editable=False,
+        verbose_name='Миниатюры изображения'
+    )
+    search_vector = SearchVectorField(
+        null=True,
+        editable=False,
+        verbose_name='Поисковый вектор'
+    )
+
+    objects = RecipeQuerySet.as_manager()
 
     class Meta:
         """
@@ -121,6 +256,12 @@ class Recipe(models.Model):
         ordering = ('-pub_date', )
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
+        indexes = [
+            models.Index(fields=['-pub_date', '-id'],
+                         name='recipe_pub_date_id_idx'),
+            models.Index(fields=['author', '-pub_date', '-id'],
+                         name='recipe_author_pub_date_idx'),
+        ]
 
     def __str__(self):
         """"
@@ -146,6 +287,11 @@ class Cart(models.Model):
         verbose_name='Рецепты',
         help_text='Выберите рецепты для добавления в корзины'
     )
+    created = models.DateTimeField(
+        auto_now_add=True,
+        db_index=True,
+        verbose_name='Дата добавления'
+    )
 
     class Meta:
         """
@@ -229,6 +375,10 @@ class TagRecipe(models.Model):
             models.UniqueConstraint(fields=['tag', 'recipe'],
                                     name='unique_tagrecipe')
         ]
+        indexes = [
+            models.Index(fields=['recipe', 'tag'],
+                         name='tagrecipe_recipe_tag_idx'),
+        ]
 
     def __str__(self):
         """"
@@ -296,6 +446,11 @@ class Favorite(models.Model):
         verbose_name='Рецепт',
         help_text='Выберите рецепт'
     )
+    created = models.DateTimeField(
+        auto_now_add=True,
+        db_index=True,
+        verbose_name='Дата добавления'
+    )
 
     class Meta:
         """
@@ -313,3 +468,166 @@ class Favorite(models.Model):
         Метод строкового представления модели.
         """
         return f'{self.recipe} {self.user}'
+
+
+class RecipePopularity(models.Model):
+    """
+    Создание модели рейтинга популярности рецептов.
+    Заполняется командой refresh_popularity.
+    Рейтинги всех рецептов рассчитываются на одно время
+    отсчета затухания reference_time.
+    """
+    recipe = models.OneToOneField(
+        Recipe,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='popularity',
+        verbose_name='Рецепт'
+    )
+    score = models.FloatField(
+        default=0,
+        verbose_name='Рейтинг'
+    )
+    updated = models.DateTimeField(
+        verbose_name='Дата расчета'
+    )
+    reference_time = models.DateTimeField(
+        verbose_name='Время отсчета затухания'
+    )
+
+    class Meta:
+        """
+        Мета параметры модели.
+        """
+        ordering = ('-score', )
+        verbose_name = 'Популярность рецепта'
+        verbose_name_plural = 'Популярность рецептов'
+        indexes = [
+            models.Index(fields=['-score', '-recipe'],
+                         name='popularity_score_idx'),
+        ]
+
+    def __str__(self):
+        """"
+        Метод строкового представления модели.
+        """
+        return f'{self.recipe} {self.score}'
+
+
+class FeedEntry(models.Model):
+    """
+    Создание модели ленты рецептов подписок пользователя.
+    Заполняется при включенной настройке FEED_INBOX.
+    """
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='feed_entries',
+        verbose_name='Пользователь'
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='feed_entries',
+        verbose_name='Рецепт'
+    )
+    pub_date = models.DateTimeField(
+        verbose_name='Дата публикации рецепта'
+    )
+
+    class Meta:
+        """
+        Мета параметры модели.
+        """
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Записи ленты'
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'recipe'],
+                                    name='unique_feed_entry')
+        ]
+        indexes = [
+            models.Index(fields=['user', '-pub_date', '-recipe'],
+                         name='feed_user_pub_date_idx'),
+        ]
+
+    def __str__(self):
+        """"
+        Метод строкового представления модели.
+        """
+        return f'{self.user} {self.recipe}'
+
+
+class ShoppingListItem(models.Model):
+    """
+    Создание модели строки списка покупок пользователя.
+    Количество продукта равно сумме его количеств
+    по рецептам в корзине пользователя.
+    """
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='shopping_list',
+        verbose_name='Пользователь'
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        related_name='shopping_list_items',
+        verbose_name='Продукт'
+    )
+    total = models.IntegerField(
+        default=0,
+        verbose_name='Количество продукта'
+    )
+
+    class Meta:
+        """
+        Мета параметры модели.
+        """
+        verbose_name = 'Строка списка покупок'
+        verbose_name_plural = 'Строки списка покупок'
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'ingredient'],
+                                    name='unique_shopping_list_item')
+        ]
+
+    def __str__(self):
+        """"
+        Метод строкового представления модели.
+        """
+        return f'{self.user} {self.ingredient} {self.total}'
+
+
+class ReferenceVersion(models.Model):
+    """
+    Создание модели версий справочников.
+    Версия хранится в базе данных, чтобы ее изменение
+    было видно всем процессам приложения. Версия — счетчик
+    изменений, время последнего изменения хранится отдельно.
+    """
+    name = models.CharField(
+        max_length=50,
+        primary_key=True,
+        verbose_name='Справочник'
+    )
+    version = models.BigIntegerField(
+        default=1,
+        verbose_name='Версия'
+    )
+    updated = models.DateTimeField(
+        default=timezone.now,
+        verbose_name='Время изменения'
+    )
+
+    class Meta:
+        """
+        Мета параметры модели.
+        """
+        verbose_name = 'Версия справочника'
+        verbose_name_plural = 'Версии справочников'
+
+    def __str__(self):
+        """"
+        Метод строкового представления модели.
+        """
+        return f'{self.name} {self.version}'
@@ -0,0 +1,112 @@
+"""
+Расчет рейтинга популярности рецептов.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import (Case, FloatField, Max, OuterRef, Subquery, Sum,
+                              Value, When)
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import Cart, Favorite, Recipe, RecipePopularity
+
+DECAY_STEPS = (1, 3, 7, 14, 30, 60, 90)
+
+
+def decay_weight(now):
+    """
+    Вес добавления в зависимости от его давности.
+    Затухание экспоненциальное с периодом полураспада
+    POPULARITY_HALF_LIFE_DAYS, приближенное ступенями DECAY_STEPS,
+    добавления старше последней ступени не учитываются.
+    Добавления после now получают вес первой ступени.
+    """
+    half_life = settings.POPULARITY_HALF_LIFE_DAYS
+    whens, previous = [], 0
+    for days in DECAY_STEPS:
+        whens.append(When(
+            created__gte=now - timedelta(days=days),
+            then=Value(0.5 ** (previous / half_life)),
+        ))
+        previous = days
+    return Case(*whens, default=Value(0.0), output_field=FloatField())
+
+
+def weighted_subquery(model, now, weight):
+    """
+    Подзапрос суммы весов добавлений рецепта в избранное или корзину.
+    """
+    return Coalesce(
+        Subquery(
+            model.objects.filter(recipe=OuterRef('pk'))
+            .order_by().values('recipe')
+            .annotate(total=Sum(decay_weight(now)))
+            .values('total'),
+            output_field=FloatField(),
+        ),
+        0.0,
+    ) * weight
+
+
+def compute_scores(recipes, now):
+    """
+    Вычисление рейтинга рецептов одним агрегирующим запросом.
+    Возвращает список пар (id рецепта, рейтинг) для рецептов
+    с положительным рейтингом.
+    """
+    return list(recipes.order_by().annotate(
+        popularity_score=(
+            weighted_subquery(
+                Favorite, now, settings.POPULARITY_FAVORITE_WEIGHT)
+            + weighted_subquery(Cart, now, settings.POPULARITY_CART_WEIGHT)
+        ),
+    ).filter(popularity_score__gt=0).values_list('id', 'popularity_score'))
+
+
+def changed_recipes(since):
+    """
+    Метод получения id рецептов, добавленных в избранное
+    или корзину начиная с since.
+    """
+    return {
+        recipe_id
+        for model in (Favorite, Cart)
+        for recipe_id in model.objects.filter(
+            created__gte=since).values_list('recipe_id', flat=True)
+    }
+
+
+@transaction.atomic
+def refresh_popularity(full=False):
+    """
+    Обновление таблицы рейтинга.
+    Без full пересчитываются только рецепты, добавленные в избранное
+    или корзину после предыдущего расчета, на время отсчета
+    затухания предыдущего полного пересчета, поэтому рейтинги
+    остаются сравнимыми. Удаления и затухание учитываются
+    при полном пересчете, который нужно выполнять периодически.
+    Возвращает число пересчитанных рецептов.
+    """
+    now = timezone.now()
+    state = RecipePopularity.objects.aggregate(
+        since=Max('updated'), reference_time=Max('reference_time'))
+    reference_time = now
+    existing = RecipePopularity.objects.all()
+    recipes = Recipe.objects.all()
+    if not full and state['since'] is not None:
+        reference_time = state['reference_time']
+        recipe_ids = changed_recipes(state['since'])
+        if not recipe_ids:
+            return 0
+        existing = existing.filter(recipe_id__in=recipe_ids)
+        recipes = recipes.filter(id__in=recipe_ids)
+    scores = compute_scores(recipes, reference_time)
+    existing.delete()
+    RecipePopularity.objects.bulk_create((
+        RecipePopularity(recipe_id=recipe_id, score=score, updated=now,
+                         reference_time=reference_time)
+        for recipe_id, score in scores
+    ), batch_size=1000)
+    return len(scores)
@@ -0,0 +1,204 @@
+"""
+Поддержка списков покупок пользователей.
+Список хранит сумму количеств каждого продукта по рецептам
+в корзине и изменяется на разницу количеств при изменении
+корзины или продуктов рецептов в корзинах.
+"""
+from django.conf import settings
+from django.db import transaction
+from django.db.models import (Case, CharField, F, IntegerField, Sum, Value,
+                              When)
+
+from .models import Cart, IngredientRecipe, Recipe, ShoppingListItem
+
+BATCH_SIZE = 1000
+
+
+def recipe_amounts(recipe_ids):
+    """
+    Метод получения суммы количеств продуктов рецептов по id продукта.
+    """
+    return dict(
+        IngredientRecipe.objects.filter(recipe_id__in=recipe_ids)
+        .order_by().values('ingredient_id')
+        .annotate(total=Sum('amount'))
+        .values_list('ingredient_id', 'total')
+    )
+
+
+def apply_changes(user_ids, changes):
+    """
+    Изменение количеств продуктов в списках покупок пользователей.
+    changes содержит изменение количества по id продукта.
+    Строки с нулевым количеством удаляются.
+    """
+    changes = {
+        ingredient_id: change
+        for ingredient_id, change in changes.items() if change
+    }
+    if not changes:
+        return
+    ShoppingListItem.objects.bulk_create((
+        ShoppingListItem(user_id=user_id, ingredient_id=ingredient_id)
+        for user_id in user_ids
+        for ingredient_id, change in changes.items() if change > 0
+    ), batch_size=BATCH_SIZE, ignore_conflicts=True)
+    items = ShoppingListItem.objects.filter(
+        user_id__in=user_ids, ingredient_id__in=changes)
+    items.update(total=F('total') + Case(
+        *[When(ingredient_id=ingredient_id, then=Value(change))
+          for ingredient_id, change in changes.items()],
+        default=Value(0),
+        output_field=IntegerField(),
+    ))
+    items.filter(total__lte=0).delete()
+
+
+def lock_recipes(recipe_ids):
+    """
+    Блокировка строк рецептов в порядке id до конца транзакции,
+    чтобы изменение продуктов рецепта и корзин с ним выполнялось
+    по очереди. Корзина блокирует сначала пользователя, затем
+    рецепты, изменение продуктов блокирует только рецепт.
+    """
+    if recipe_ids:
+        list(Recipe.objects.select_for_update().filter(
+            id__in=recipe_ids).order_by('id').values_list('id', flat=True))
+
+
+def add_cart_recipes(user_id, recipe_ids):
+    """
+    Добавление продуктов рецептов в список покупок пользователя.
+    """
+    lock_recipes(recipe_ids)
+    apply_changes([user_id], recipe_amounts(recipe_ids))
+
+
+def remove_cart_recipes(user_id, recipe_ids):
+    """
+    Удаление продуктов рецептов из списка покупок пользователя.
+    """
+    lock_recipes(recipe_ids)
+    apply_changes([user_id], {
+        ingredient_id: -total
+        for ingredient_id, total in recipe_amounts(recipe_ids).items()
+    })
+
+
+def change_recipe_ingredients(recipe_id, changes):
+    """
+    Изменение списков покупок пользователей, у которых
+    рецепт в корзине, после изменения продуктов рецепта.
+    """
+    apply_changes(
+        Cart.objects.filter(recipe_id=recipe_id).values_list(
+            'user_id', flat=True),
+        changes,
+    )
+
+
+def remove_recipe(recipe_id):
+    """
+    Удаление продуктов рецепта из списков покупок
+    перед удалением рецепта.
+    """
+    change_recipe_ingredients(recipe_id, {
+        ingredient_id: -total
+        for ingredient_id, total in recipe_amounts([recipe_id]).items()
+    })
+
+
+def unit_conversion(field):
+    """
+    Выражения базовой единицы измерения и множителя количества
+    для единицы из поля field по таблице
+    SHOPPING_LIST_UNIT_CONVERSIONS.
+    """
+    conversions = settings.SHOPPING_LIST_UNIT_CONVERSIONS.items()
+    if not conversions:
+        return F(field), Value(1)
+    unit = Case(
+        *[When(**{field: unit}, then=Value(base_unit))
+          for unit, (base_unit, _) in conversions],
+        default=F(field),
+        output_field=CharField(),
+    )
+    factor = Case(
+        *[When(**{field: unit}, then=Value(factor))
+          for unit, (_, factor) in conversions],
+        default=Value(1),
+        output_field=IntegerField(),
+    )
+    return unit, factor
+
+
+def shopping_list_rows(user):
+    """
+    Метод получения строк списка покупок пользователя
+    с ключами name, measurement_unit и amount.
+    Количества в совместимых единицах переводятся в базовую
+    единицу в запросе, каждый продукт занимает одну строку.
+    """
+    unit, factor = unit_conversion('ingredient__measurement_unit')
+    return ShoppingListItem.objects.filter(user=user).values(
+        name=F('ingredient__name'), measurement_unit=unit,
+    ).annotate(
+        amount=Sum(F('total') * factor),
+    ).order_by('name', 'measurement_unit')
+
+
+def expected_items(user_ids=None):
+    """
+    Метод вычисления списков покупок по корзинам.
+    Возвращает словарь количеств по паре id пользователя и продукта.
+    """
+    carts = Cart.objects.filter(recipe__ingredientrecipes__isnull=False)
+    if user_ids is not None:
+        carts = carts.filter(user_id__in=user_ids)
+    return {
+        (user_id, ingredient_id): total
+        for user_id, ingredient_id, total in carts.values(
+            'user_id', 'recipe__ingredientrecipes__ingredient_id',
+        ).annotate(
+            total=Sum('recipe__ingredientrecipes__amount'),
+        ).order_by().values_list(
+            'user_id', 'recipe__ingredientrecipes__ingredient_id', 'total',
+        ).iterator()
+    }
+
+
+def find_drift():
+    """
+    Метод поиска пользователей, чей список покупок
+    не совпадает с корзиной.
+    """
+    expected = expected_items()
+    rows = ShoppingListItem.objects.values_list(
+        'user_id', 'ingredient_id', 'total')
+    actual = {
+        (user_id, ingredient_id): total
+        for user_id, ingredient_id, total in rows.iterator()
+    }
+    return sorted({
+        key[0] for key in expected.keys() | actual.keys()
+        if expected.get(key) != actual.get(key)
+    })
+
+
+@transaction.atomic
+def rebuild_shopping_lists(user_ids=None):
+    """
+    Перестроение списков покупок пользователей с id из user_ids
+    или всех пользователей. Возвращает число строк списков.
+    """
+    items = ShoppingListItem.objects.all()
+    if user_ids is not None:
+        items = items.filter(user_id__in=user_ids)
+    items.delete()
+    ShoppingListItem.objects.bulk_create((
+        ShoppingListItem(
+            user_id=user_id, ingredient_id=ingredient_id, total=total)
+        for (user_id, ingredient_id), total in expected_items(
+            user_ids).items()
+    ), batch_size=BATCH_SIZE)
+    return items.count()
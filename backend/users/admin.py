@@ -12,6 +12,8 @@ class UserAdmin(admin.ModelAdmin):
         'first_name',
         'last_name',
         'role',
+        'recipes_count',
+        'followers_count',
     )
     list_filter = ('email', 'username')
     search_fields = ('username',)